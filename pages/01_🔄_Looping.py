@@ -7,6 +7,10 @@ from web3 import Web3
 import requests
 import os
 import json
+from uni_v3_kit.fixtures import activate_from_env
+
+# Record/replay de yfinance si UNI_V3_FIXTURE_MODE está definido
+activate_from_env()
 
 # ==============================================================================
 #  CONFIGURACIÓN DE LA PÁGINA Y ESTILOS
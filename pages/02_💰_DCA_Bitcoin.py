@@ -6,6 +6,10 @@ import matplotlib.pyplot as plt
 import datetime
 import requests
 from calendar import monthrange
+from uni_v3_kit.fixtures import activate_from_env
+
+# Record/replay de yfinance si UNI_V3_FIXTURE_MODE está definido
+activate_from_env()
 
 # --- CONFIGURACIÓN DE LA PÁGINA ---
 st.set_page_config(
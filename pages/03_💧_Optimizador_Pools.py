@@ -3,6 +3,10 @@ import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 import yfinance as yf
+from uni_v3_kit.fixtures import activate_from_env
+
+# Record/replay de yfinance si UNI_V3_FIXTURE_MODE está definido
+activate_from_env()
 
 # --- 1. CONFIGURACIÓN ---
 st.set_page_config(page_title="Liquidity Pro Calc", layout="wide")
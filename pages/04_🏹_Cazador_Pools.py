@@ -4,8 +4,12 @@ import plotly.express as px
 from uni_v3_kit.analyzer import MarketScanner
 from uni_v3_kit.data_provider import DataProvider
 from uni_v3_kit.backtester import Backtester
+from uni_v3_kit.warmer import start_from_env as start_cache_warmer
 from auth_module import require_nft_authentication
 
+# Warmer de caché de pools (solo si UNI_V3_WARMER=1; una vez por proceso)
+start_cache_warmer()
+
 # Verificar autenticación
 require_nft_authentication()
 
@@ -1 +1,4 @@
+from .fixtures import activate_from_env
 
+# Record/replay de yfinance si UNI_V3_FIXTURE_MODE está definido (ver fixtures.py)
+activate_from_env()
@@ -1,12 +1,58 @@
 from .data_provider import DataProvider
 from .math_core import V3Math
+from .pool_history import PoolHistory
+from .batch_metrics import batch_pool_metrics
+from .result_cache import get_result_cache, make_key
+import numpy as np
 import pandas as pd
+import heapq
 import math
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+class PoolFilter:
+    """Filtros baratos del escáner sobre un registro del listado (red, TVL, activos)."""
+    def __init__(self, target_chains, min_tvl, assets_to_search):
+        self.target_chains = target_chains
+        self.min_tvl = min_tvl
+        self.assets = assets_to_search
+
+    def __call__(self, p):
+        # 1. Filtro Red
+        p_chain = p.get('ChainId')
+        if self.target_chains and p_chain not in self.target_chains:
+            return False
+            
+        # 2. Filtro TVL
+        try: tvl = float(p.get('Liquidity', 0))
+        except: tvl = 0
+        if tvl < self.min_tvl: return False
+        
+        # 3. Filtro Activos
+        if self.assets:
+            base = str(p.get('BaseToken', '')).upper()
+            quote = str(p.get('QuoteToken', '')).upper()
+            for asset in self.assets:
+                if asset in base or asset in quote:
+                    return True
+            return False
+
+        return True
 
 class MarketScanner:
-    def __init__(self):
+    def __init__(self, max_workers=16, request_timeout=None, stream_catalogue=False, batch_metrics=True,
+                 cache=None, scan_ttl=600):
         self.data = DataProvider()
         self.math = V3Math()
+        # Descarga concurrente de historiales (límite de peticiones simultáneas)
+        self.max_workers = max_workers
+        self.request_timeout = request_timeout
+        # True: el listado se parsea en streaming y se filtra al vuelo (memoria plana)
+        self.stream_catalogue = stream_catalogue
+        # True: métricas de todos los candidatos en bloque (NumPy) en vez de pool a pool
+        self.batch_metrics = batch_metrics
+        # Caché de resultados de scan (None: la del proceso; False: sin caché) y su vigencia
+        self.cache = get_result_cache() if cache is None else (cache or None)
+        self.scan_ttl = scan_ttl
 
     def _calculate_probability_in_range(self, sd_multiplier):
         """Calcula probabilidad de estar en rango (distribución normal)"""
@@ -15,33 +61,27 @@ class MarketScanner:
 
     def _process_pool_data(self, pool_detail, days_window, sd_multiplier=1.0):
         """Procesa datos de un pool y devuelve métricas clave."""
-        history = pool_detail.get('history', [])
+        history = PoolHistory.coerce(pool_detail.get('history', []))
         
         # Necesitamos historial suficiente para calcular volatilidad
         min_history_days = max(days_window, 30)
-        recent_data = history[:min_history_days * 3] if history else []
+        recent_data = history[:min_history_days * 3]
         
-        if not recent_data: return None
+        if not len(recent_data): return None
 
         # --- 1. APR Promedio (Ventana seleccionada) ---
-        data_window = history[:days_window * 3]
-        aprs = [x.get('apr', 0) for x in data_window if x.get('apr') is not None]
+        aprs = history.apr[:days_window * 3]
+        aprs = aprs[~np.isnan(aprs)]
         
-        if aprs:
+        if aprs.size:
             # API devuelve 50.5 para 50.5%. Pasamos a decimal 0.505
-            apr_promedio_anual = sum(aprs) / len(aprs) / 100.0 
+            apr_promedio_anual = float(aprs.mean()) / 100.0 
         else:
             apr_promedio_anual = 0.0
 
         # --- 2. Volatilidad Real (Anualizada) ---
-        prices = []
-        for x in recent_data:
-            p_native = x.get('priceNative')
-            p_usd = x.get('priceUsd')
-            if p_native is not None and isinstance(p_native, (int, float)) and p_native > 0:
-                prices.append(float(p_native))
-            elif p_usd is not None and isinstance(p_usd, (int, float)) and p_usd > 0:
-                prices.append(float(p_usd))
+        # price ya resuelve el fallback priceNative -> priceUsd (NaN si no hay precio válido)
+        prices = recent_data.price[~np.isnan(recent_data.price)]
         
         vol_annual = self.math.calculate_realized_volatility(prices)
         
@@ -75,6 +115,25 @@ class MarketScanner:
         ratio_br = probable_yield / riesgo_safe
         
         # --- 6. Datos Básicos ---
+        nombre_par, chain_id, dex_id, tvl = self._describe_pool(pool_detail, history)
+
+        return {
+            "Par": nombre_par,
+            "Red": chain_id,
+            "DEX": dex_id,
+            "TVL": tvl,
+            f"APR ({days_window}d)": apr_promedio_anual,
+            "Volatilidad": vol_annual * 100.0,      # %
+            "Rango Est.": range_width_pct * 100.0,  # %
+            # "Prob. Rango": prob_in_range * 100.0, # Eliminado
+            "Est. Fees": probable_yield * 100.0,    # %
+            "IL": il_loss_at_limit * 100.0,         # % (Renombrado de Max IL)
+            "Ratio F/IL": ratio_br,                 # Ratio numérico
+            "Margen": margen * 100.0                # %
+        }
+
+    def _describe_pool(self, pool_detail, history):
+        """Nombre del par, red, DEX y TVL (con fallback al historial)."""
         nombre_par = pool_detail.get('poolName')
         if not nombre_par: 
             base = pool_detail.get('BaseToken') or '?'
@@ -92,27 +151,60 @@ class MarketScanner:
         
         # TVL con Fallback
         tvl = float(pool_detail.get('Liquidity', 0) or 0)
-        if tvl == 0 and history:
-            for snap in history:
-                snap_liq = float(snap.get('Liquidity', 0) or 0)
-                if snap_liq > 0:
-                    tvl = snap_liq
-                    break
+        if tvl == 0 and len(history):
+            positive = np.flatnonzero(history.liquidity > 0)
+            if positive.size:
+                tvl = float(history.liquidity[positive[0]])
 
-        return {
-            "Par": nombre_par,
-            "Red": chain_id,
-            "DEX": dex_id,
-            "TVL": tvl,
-            f"APR ({days_window}d)": apr_promedio_anual,
-            "Volatilidad": vol_annual * 100.0,      # %
-            "Rango Est.": range_width_pct * 100.0,  # %
-            # "Prob. Rango": prob_in_range * 100.0, # Eliminado
-            "Est. Fees": probable_yield * 100.0,    # %
-            "IL": il_loss_at_limit * 100.0,         # % (Renombrado de Max IL)
-            "Ratio F/IL": ratio_br,                 # Ratio numérico
-            "Margen": margen * 100.0                # %
-        }
+        return nombre_par, chain_id, dex_id, tvl
+
+    def process_batch(self, pool_details, days_window, sd_multiplier=1.0):
+        """
+        Versión vectorizada de _process_pool_data para muchos pools.
+        `pool_details` es una lista de (address, pool_detail); devuelve el DataFrame
+        de resultados (mismas columnas + Address) en el mismo orden.
+        """
+        histories = [PoolHistory.coerce(d.get('history', [])) if d else PoolHistory.empty()
+                     for _, d in pool_details]
+        m = batch_pool_metrics(histories, days_window, sd_multiplier)
+
+        idx = np.flatnonzero(m["valid"])
+        labels = [self._describe_pool(pool_details[i][1], histories[i]) for i in idx]
+        return pd.DataFrame({
+            "Par": [l[0] for l in labels],
+            "Red": [l[1] for l in labels],
+            "DEX": [l[2] for l in labels],
+            "TVL": np.array([l[3] for l in labels], dtype=float),
+            f"APR ({days_window}d)": m["apr"][idx],
+            "Volatilidad": m["vol"][idx] * 100.0,
+            "Rango Est.": m["range_width"][idx] * 100.0,
+            "Est. Fees": m["probable_yield"][idx] * 100.0,
+            "IL": m["il"][idx] * 100.0,
+            "Ratio F/IL": m["ratio"][idx],
+            "Margen": m["margen"][idx] * 100.0,
+            "Address": [pool_details[i][0] for i in idx],
+        })
+
+    def fetch_histories(self, addresses):
+        """
+        Descarga los historiales en paralelo con un pool de hilos acotado.
+        Genera (address, pool_detail) según van llegando las respuestas.
+        """
+        if not addresses: return
+        workers = max(1, min(self.max_workers, len(addresses)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(self.data.get_pool_history, address, self.request_timeout): address
+                for address in addresses
+            }
+            for future in as_completed(futures):
+                address = futures[future]
+                try:
+                    pool_detail = future.result()
+                except Exception as e:
+                    print(f"Error descargando pool {address}: {e}")
+                    pool_detail = {}
+                yield address, pool_detail
 
     def analyze_single_pool(self, address, days_window=7, sd_multiplier=1.0):
         pool_detail = self.data.get_pool_history(address)
@@ -125,59 +217,68 @@ class MarketScanner:
         return pd.DataFrame()
 
     def scan(self, target_chains, min_tvl, days_window, sd_multiplier, min_apr, selected_assets, custom_asset=None):
-        raw_pools = self.data.get_all_pools()
-        candidates = []
-        
+        args = (target_chains, min_tvl, days_window, sd_multiplier, min_apr, selected_assets, custom_asset)
+        if self.cache is None or self.stream_catalogue: return self._scan(*args)
+
+        # Clave: filtros + hash del listado actual; la entrada caduca a los scan_ttl segundos
+        self.data.refresh_pools()
+        content_hash = self.data.catalogue.content_hash
+        if content_hash is None: return self._scan(*args)
+        key = make_key("scan", self.data.base_url, content_hash, self.batch_metrics, *args)
+        df = self.cache.get(key, max_age=self.scan_ttl)
+        if df is None:
+            df = self._scan(*args)
+            self.cache.put(key, df)
+        return df
+
+    def _scan(self, target_chains, min_tvl, days_window, sd_multiplier, min_apr, selected_assets, custom_asset=None):
         # Preparar búsqueda de activos
         assets_to_search = []
         if selected_assets:
             assets_to_search = [a.upper() for a in selected_assets if a != "Otro"]
         if custom_asset:
             assets_to_search.append(custom_asset.upper())
-            
-        for p in raw_pools:
-            # 1. Filtro Red
-            p_chain = p.get('ChainId')
-            if target_chains and p_chain not in target_chains:
-                continue
-                
-            # 2. Filtro TVL
-            try: tvl = float(p.get('Liquidity', 0))
-            except: tvl = 0
-            if tvl < min_tvl: continue
-            
-            # 3. Filtro Activos
-            if assets_to_search:
-                base = str(p.get('BaseToken', '')).upper()
-                quote = str(p.get('QuoteToken', '')).upper()
-                found = False
-                for asset in assets_to_search:
-                    if asset in base or asset in quote:
-                        found = True
-                        break
-                if not found: continue
-
-            candidates.append(p)
-        
-        # Priorizar por Volumen
-        candidates = sorted(candidates, key=lambda x: float(x.get('Volume', 0)), reverse=True)[:150]
-        
-        results = []
+
+        pool_filter = PoolFilter(target_chains, min_tvl, assets_to_search)
+        if self.stream_catalogue:
+            # Parseo en streaming: solo se conservan los pools que pasan el filtro
+            candidates = self.data.iter_pools(pool_filter)
+        else:
+            # Consulta por intersección sobre el índice del listado (red + TVL + activos)
+            candidates = self.data.get_pool_index().select(target_chains, min_tvl, assets_to_search)
+        
+        # Priorizar por Volumen (nlargest equivale a sorted(reverse=True)[:150] sin guardar todo)
+        candidates = heapq.nlargest(150, candidates, key=lambda x: float(x.get('Volume', 0)))
+        
+        addresses = []
         for pool in candidates:
             address = pool.get('pairAddress') 
             if not address: address = pool.get('_id') 
+            addresses.append(address)
+        order = {address: i for i, address in enumerate(addresses)}
 
-            pool_detail = self.data.get_pool_history(address)
-            result = self._process_pool_data(pool_detail, days_window, sd_multiplier)
-            
-            if result:
-                # 4. Filtro APR Mínimo
-                apr_calc = result.get(f"APR ({days_window}d)", 0) * 100
-                if apr_calc >= min_apr:
-                    result['Address'] = address
-                    results.append(result)
-            
-        df = pd.DataFrame(results)
+        if self.batch_metrics:
+            # Descarga concurrente y cálculo vectorizado de todos los candidatos a la vez
+            details = dict(self.fetch_histories(addresses))
+            df = self.process_batch([(a, details.get(a)) for a in addresses], days_window, sd_multiplier)
+            # 4. Filtro APR Mínimo
+            df = df[df[f"APR ({days_window}d)"] * 100 >= min_apr].reset_index(drop=True)
+        else:
+            # Procesamos cada pool en cuanto llega su historial
+            results = []
+            for address, pool_detail in self.fetch_histories(addresses):
+                result = self._process_pool_data(pool_detail, days_window, sd_multiplier)
+                
+                if result:
+                    # 4. Filtro APR Mínimo
+                    apr_calc = result.get(f"APR ({days_window}d)", 0) * 100
+                    if apr_calc >= min_apr:
+                        result['Address'] = address
+                        results.append((order[address], result))
+
+            # Restauramos el orden por volumen (las respuestas llegan desordenadas)
+            results = [r for _, r in sorted(results, key=lambda x: x[0])]
+            df = pd.DataFrame(results)
         
         if not df.empty:
             # Ordenar por Ratio F/IL descendente y devolver Top 100
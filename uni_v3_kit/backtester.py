@@ -1,17 +1,43 @@
+import numpy as np
 import pandas as pd
 import math
-from datetime import datetime
 from .math_core import V3Math
+from .pool_history import PoolHistory, dates_to_datetime64
+from .rolling_vol import PRICE_ESTIMATORS, RollingVolatility
+from .result_cache import get_result_cache, make_key
+
+def _next_exit(prices, pos, lower, upper, block=64):
+    """
+    Primer índice >= pos con precio fuera de [lower, upper], o len(prices).
+    Busca en bloques crecientes: el coste es proporcional al tramo recorrido.
+    """
+    n = len(prices)
+    while pos < n:
+        chunk = prices[pos:pos + block]
+        out = np.flatnonzero((chunk < lower) | (chunk > upper))
+        if len(out): return pos + int(out[0])
+        pos += block
+        block *= 2
+    return n
+
+
+# Columnas proporcionales al capital invertido (el resto solo depende del precio)
+SCALED_COLUMNS = ["Fees Period", "Fees Acum", "Valor Principal", "Valor Total", "HODL Value"]
+
 
 class Backtester:
-    def __init__(self):
+    def __init__(self, cache=None, scale_investment=True, verify_scaling=False):
         self.math = V3Math()
+        # None: caché de resultados compartida del proceso; False: sin caché
+        self.cache = get_result_cache() if cache is None else (cache or None)
+        # La simulación es lineal en investment_usd: se simula con 1 USD y se escala.
+        # verify_scaling=True simula también con el capital real y comprueba que coinciden.
+        self.scale_investment = scale_investment
+        self.verify_scaling = verify_scaling
 
-    def _parse_date(self, date_val):
-        try:
-            return datetime.strptime(str(date_val), "%Y%m%d%H%M%S")
-        except:
-            return date_val
+    def _parse_dates(self, dates):
+        """Columna de fechas YYYYMMDDHHMMSS en bloque (datetime64); NaT si no es parseable."""
+        return dates_to_datetime64(dates).astype('datetime64[us]')
 
     def _calculate_liquidity_and_amounts(self, principal_usd, p_native, p_base_usd, lower, upper):
         """Helper para calcular L y tokens iniciales dado un capital en USD"""
@@ -42,43 +68,232 @@ class Backtester:
         
         return L, amount_x_unit * L, amount_y_unit * L
 
-    def _calculate_dynamic_range(self, full_data, current_idx, vol_days, sd_multiplier):
+    def _calculate_dynamic_range(self, full_data, current_idx, vol_days, sd_multiplier, rolling=None, estimator="realized"):
         """Calcula el ancho del rango basándose en la volatilidad reciente."""
         samples_needed = vol_days * 3
         start_idx = max(0, current_idx - samples_needed)
         
-        recent_window = full_data[start_idx : current_idx]
-        prices = [x.get('priceNative') or x.get('priceUsd') for x in recent_window]
-        
-        vol_annual = self.math.calculate_realized_volatility(prices)
+        # Volatilidad exacta de la ventana sobre los retornos ya calculados del historial
+        # (full_data es un PoolHistory: price ya trae el fallback priceNative -> priceUsd)
+        if rolling is None:
+            # Consulta suelta: basta con la ventana
+            window = RollingVolatility(full_data.price[start_idx : current_idx])
+            vol_annual = window.annualized(0, current_idx - start_idx, estimator)
+        else:
+            vol_annual = rolling.annualized(start_idx, current_idx, estimator)
         time_scaling = math.sqrt(vol_days / 365.0)
         
         range_width_pct = vol_annual * time_scaling * sd_multiplier
         return max(0.01, min(range_width_pct, 1.0)), vol_annual
 
-    def run_simulation(self, history, investment_usd, sd_multiplier, sim_days=30, vol_days=7, fee_tier=0.003, auto_rebalance=False):
-        if not history: return None
-        
+    def _valid_rows(self, history, start):
+        """Filas simulables desde `start` (los snapshots sin precio se saltan, como el `continue` del bucle)."""
+        p_native = np.nan_to_num(history.price[start:])
+        p_base_usd = np.nan_to_num(history.price_usd[start:])
+        apr = np.nan_to_num(history.apr[start:])
+        dates = history.date[start:]
+        positions = np.arange(start, len(history))
+
+        keep = (p_native != 0) & (p_base_usd != 0)
+        if not keep.all():
+            p_native, p_base_usd, apr, dates, positions = (
+                p_native[keep], p_base_usd[keep], apr[keep], dates[keep], positions[keep]
+            )
+        return p_native, p_base_usd, apr, dates, positions
+
+    def _result_frame(self, p_native, p_base_usd, apr, dates, liquidity, lower, upper, range_width_pct, in_range, hodl_x, hodl_y):
+        """
+        Columnas del resultado como operaciones de arrays (mismas fórmulas y orden que
+        el bucle de referencia). liquidity / lower / upper / range_width_pct pueden ser
+        escalares o un valor por fila.
+        """
+        p_quote_usd = p_base_usd / p_native
+
+        curr_x, curr_y = self.math.calculate_amounts(liquidity, np.sqrt(p_native), np.sqrt(lower), np.sqrt(upper))
+        val_pos_usd = (curr_x * p_base_usd) + (curr_y * p_quote_usd)
+
+        # Fees solo en rango y con APR; cumsum suma en el mismo orden que el acumulador del bucle
+        yield_period_8h = (apr / 100.0) / 1095.0
+        fees_period = np.where(in_range & (apr != 0), val_pos_usd * yield_period_8h, 0.0)
+        fees_acum = np.cumsum(fees_period)
+
+        val_hodl = (hodl_x * p_base_usd) + (hodl_y * p_quote_usd)
+
+        n = len(p_native)
+        return pd.DataFrame({
+            "Date": self._parse_dates(dates),
+            "Price": p_native,
+            "Range Min": np.broadcast_to(lower, n),
+            "Range Max": np.broadcast_to(upper, n),
+            "Range Width %": np.broadcast_to(range_width_pct * 100, n),
+            "In Range": np.broadcast_to(in_range, n),
+            "APR Period": apr,
+            "Fees Period": fees_period,
+            "Fees Acum": fees_acum,
+            "Valor Principal": val_pos_usd,
+            "Valor Total": val_pos_usd + fees_acum,
+            "HODL Value": val_hodl,
+        })
+
+    def _simulate_static(self, history, start, liquidity, hodl_x, hodl_y, lower, upper, range_width_pct):
+        """Simulación sin rebalanceo: rango y liquidez no cambian, todo son operaciones de arrays."""
+        p_native, p_base_usd, apr, dates, _ = self._valid_rows(history, start)
+        if not len(p_native): return pd.DataFrame([])
+
+        in_range = (lower <= p_native) & (p_native <= upper)
+        return self._result_frame(p_native, p_base_usd, apr, dates, liquidity, lower, upper, range_width_pct,
+                                  in_range, hodl_x, hodl_y)
+
+    def _simulate_rebalancing(self, history, start, liquidity, hodl_x, hodl_y, lower, upper, range_width_pct,
+                              rolling, vol_days, sd_multiplier, estimator):
+        """
+        Simulación con rebalanceo guiada por eventos: entre dos salidas de rango la
+        posición no cambia, así que solo se trabaja en Python en cada rebalanceo y
+        los tramos intermedios se rellenan en bloque.
+        Devuelve (DataFrame, nº de rebalanceos, ancho final).
+        """
+        p_native, p_base_usd, apr, dates, positions = self._valid_rows(history, start)
+        if not len(p_native): return pd.DataFrame([]), 0, range_width_pct
+
+        # Tramos: fila de inicio + parámetros de la posición (la primera fila es el centro del rango)
+        seg_start, seg_liquidity, seg_lower, seg_upper, seg_width = [0], [liquidity], [lower], [upper], [range_width_pct]
+        j = 0
+        while True:
+            j = _next_exit(p_native, j + 1, lower, upper)
+            if j >= len(p_native): break
+
+            # --- Rebalanceo (idéntico al bucle de referencia) ---
+            p_native_t = float(p_native[j])
+            p_base_usd_t = float(p_base_usd[j])
+            p_quote_usd_t = p_base_usd_t / p_native_t
+
+            ax, ay = self.math.calculate_amounts(liquidity, math.sqrt(p_native_t), math.sqrt(lower), math.sqrt(upper))
+            curr_val_usd = (ax * p_base_usd_t) + (ay * p_quote_usd_t)
+            current_principal_usd = curr_val_usd * 0.997 # Coste swap
+
+            range_width_pct, _ = self._calculate_dynamic_range(history, int(positions[j]), vol_days, sd_multiplier, rolling, estimator)
+            lower = p_native_t * (1 - range_width_pct)
+            upper = p_native_t * (1 + range_width_pct)
+            liquidity, _, _ = self._calculate_liquidity_and_amounts(
+                current_principal_usd, p_native_t, p_base_usd_t, lower, upper
+            )
+
+            seg_start.append(j)
+            seg_liquidity.append(liquidity)
+            seg_lower.append(lower)
+            seg_upper.append(upper)
+            seg_width.append(range_width_pct)
+
+        # Tras cada rebalanceo el precio queda dentro del nuevo rango: todas las filas están en rango
+        lengths = np.diff(np.append(seg_start, len(p_native)))
+        df = self._result_frame(
+            p_native, p_base_usd, apr, dates,
+            np.repeat(np.asarray(seg_liquidity, dtype=float), lengths),
+            np.repeat(seg_lower, lengths), np.repeat(seg_upper, lengths), np.repeat(seg_width, lengths),
+            True, hodl_x, hodl_y,
+        )
+        return df, len(seg_start) - 1, range_width_pct
+
+    @staticmethod
+    def _check_estimator(vol_estimator):
+        # Los historiales solo traen un precio por snapshot: sin highs/lows no hay parkinson
+        if vol_estimator not in PRICE_ESTIMATORS:
+            raise ValueError(f"Estimador de volatilidad no soportado en el backtest: {vol_estimator} "
+                             f"(disponibles: {', '.join(PRICE_ESTIMATORS)})")
+
+    def run_simulation(self, history, investment_usd, sd_multiplier, sim_days=30, vol_days=7, fee_tier=0.003, auto_rebalance=False, vol_estimator="realized", engine="auto"):
+        self._check_estimator(vol_estimator)
+        history = PoolHistory.coerce(history)
+        if not len(history): return None
+        params = (sd_multiplier, sim_days, vol_days, fee_tier, auto_rebalance, vol_estimator, engine)
+        if not self.scale_investment:
+            return self._cached_simulation(history, investment_usd, *params)
+
+        result = self._cached_simulation(history, 1.0, *params)
+        if investment_usd != 1.0:
+            result = self.scale_result(result, investment_usd)
+        if self.verify_scaling:
+            self.assert_equivalent(result, self._simulate(history, investment_usd, *params))
+        return result
+
+    def run_investment_sweep(self, history, investments, sd_multiplier, sim_days=30, vol_days=7, fee_tier=0.003, auto_rebalance=False, vol_estimator="realized"):
+        """Resultados para varios capitales con una sola simulación: {capital: resultado}."""
+        self._check_estimator(vol_estimator)
+        history = PoolHistory.coerce(history)
+        if not len(history): return {amount: None for amount in investments}
+        unit = self._cached_simulation(history, 1.0, sd_multiplier, sim_days, vol_days, fee_tier, auto_rebalance, vol_estimator, "auto")
+        return {amount: self.scale_result(unit, amount) for amount in investments}
+
+    @staticmethod
+    def scale_result(result, investment_usd):
+        """Resultado de 1 USD llevado a `investment_usd` (solo multiplica las columnas de valor)."""
+        if result is None: return None
+        df, min_p, max_p, metadata = result
+        df = df.copy()
+        if len(df):
+            df[SCALED_COLUMNS] = df[SCALED_COLUMNS].to_numpy() * investment_usd
+        return df, min_p, max_p, dict(metadata)
+
+    @staticmethod
+    def assert_equivalent(result, expected, rtol=1e-9):
+        """
+        Comprueba que un resultado escalado coincide con la simulación directa.
+        Lanza AssertionError si no (explícito: funciona también con python -O).
+        """
+        if result is None or expected is None:
+            if result is not None or expected is not None:
+                raise AssertionError("Un resultado es None y el otro no")
+            return
+        df, df_expected = result[0], expected[0]
+        if list(df.columns) != list(df_expected.columns) or len(df) != len(df_expected):
+            raise AssertionError("Distinta forma")
+        for col in df.columns:
+            if col in SCALED_COLUMNS:
+                scale = max(1.0, float(np.abs(df_expected[col]).max()))
+                np.testing.assert_allclose(df[col].to_numpy(), df_expected[col].to_numpy(), rtol=rtol, atol=rtol * scale, err_msg=col)
+            elif not df[col].equals(df_expected[col]):
+                raise AssertionError(f"Columna distinta: {col}")
+        if result[1:3] != expected[1:3]:
+            raise AssertionError("Límites iniciales distintos")
+        if result[3] != expected[3]:
+            raise AssertionError("Metadatos distintos")
+
+    def _cached_simulation(self, history, investment_usd, sd_multiplier, sim_days, vol_days, fee_tier, auto_rebalance, vol_estimator, engine):
+        args = (history, investment_usd, sd_multiplier, sim_days, vol_days, fee_tier, auto_rebalance, vol_estimator, engine)
+        if self.cache is None: return self._simulate(*args)
+
+        # Misma simulación sobre el mismo historial -> resultado guardado (reruns de Streamlit)
+        key = make_key("backtest", history.fingerprint(), float(investment_usd), float(sd_multiplier), int(sim_days),
+                       int(vol_days), float(fee_tier), bool(auto_rebalance), vol_estimator, engine)
+        return self.cache.get_or_compute(key, self._simulate, *args)
+
+    def _simulate(self, history, investment_usd, sd_multiplier, sim_days, vol_days, fee_tier, auto_rebalance, vol_estimator, engine):
         # 1. Preparar Datos
         total_samples = (sim_days + vol_days) * 3
         full_history_chrono = history[:total_samples][::-1]
         
+        # Columnas como listas de floats (NaN -> 0, igual que el antiguo `or 0`)
+        prices_native = np.nan_to_num(full_history_chrono.price).tolist()
+        prices_usd = np.nan_to_num(full_history_chrono.price_usd).tolist()
+        aprs = np.nan_to_num(full_history_chrono.apr).tolist()
+        dates = full_history_chrono.date.tolist()
+        
         min_warmup_samples = vol_days * 3
         if len(full_history_chrono) < min_warmup_samples + 1:
             return None
 
         sim_start_idx = min_warmup_samples
+        # Sumas acumuladas de volatilidad: solo hacen falta si hay rebalanceos
+        rolling = RollingVolatility.from_history(full_history_chrono) if auto_rebalance else None
         
         # --- 2. Inicialización ---
-        start_point = full_history_chrono[sim_start_idx]
-        
-        p_base_usd_0 = start_point.get('priceUsd', 0)
-        p_native_0 = start_point.get('priceNative') or start_point.get('priceUsd', 0)
+        p_base_usd_0 = prices_usd[sim_start_idx]
+        p_native_0 = prices_native[sim_start_idx]
         
         if not p_base_usd_0 or not p_native_0: return None
 
         # A. Calcular Rango Inicial
-        range_width_pct, initial_vol = self._calculate_dynamic_range(full_history_chrono, sim_start_idx, vol_days, sd_multiplier)
+        range_width_pct, initial_vol = self._calculate_dynamic_range(full_history_chrono, sim_start_idx, vol_days, sd_multiplier, rolling, vol_estimator)
         
         lower_price = p_native_0 * (1 - range_width_pct)
         upper_price = p_native_0 * (1 + range_width_pct)
@@ -98,75 +313,87 @@ class Backtester:
         
         results = []
         
-        # --- 3. Bucle de Simulación ---
-        for i in range(sim_start_idx, len(full_history_chrono)):
-            snap = full_history_chrono[i]
-            
-            p_native_t = snap.get('priceNative') or snap.get('priceUsd', 0)
-            p_base_usd_t = snap.get('priceUsd', 0)
+        if engine != "reference" and not auto_rebalance:
+            # --- 3. Rango fijo: toda la simulación como operaciones de arrays ---
+            df = self._simulate_static(
+                full_history_chrono, sim_start_idx, liquidity, hodl_x, hodl_y, lower_price, upper_price, range_width_pct
+            )
+        elif engine != "reference":
+            # --- 3. Rebalanceo: solo se itera sobre las salidas de rango ---
+            df, rebalance_count, range_width_pct = self._simulate_rebalancing(
+                full_history_chrono, sim_start_idx, liquidity, hodl_x, hodl_y, lower_price, upper_price, range_width_pct,
+                rolling, vol_days, sd_multiplier, vol_estimator
+            )
+        else:
+            # --- 3. Bucle de Simulación (motor de referencia) ---
+            for i in range(sim_start_idx, len(full_history_chrono)):
+                p_native_t = prices_native[i]
+                p_base_usd_t = prices_usd[i]
             
-            if p_native_t == 0 or p_base_usd_t == 0: continue
+                if p_native_t == 0 or p_base_usd_t == 0: continue
             
-            p_quote_usd_t = p_base_usd_t / p_native_t
+                p_quote_usd_t = p_base_usd_t / p_native_t
             
-            # --- A. Rebalanceo ---
-            in_range = lower_price <= p_native_t <= upper_price
+                # --- A. Rebalanceo ---
+                in_range = lower_price <= p_native_t <= upper_price
             
-            if auto_rebalance and not in_range:
-                ax, ay = self.math.calculate_amounts(liquidity, math.sqrt(p_native_t), math.sqrt(lower_price), math.sqrt(upper_price))
-                curr_val_usd = (ax * p_base_usd_t) + (ay * p_quote_usd_t)
+                if auto_rebalance and not in_range:
+                    ax, ay = self.math.calculate_amounts(liquidity, math.sqrt(p_native_t), math.sqrt(lower_price), math.sqrt(upper_price))
+                    curr_val_usd = (ax * p_base_usd_t) + (ay * p_quote_usd_t)
                 
-                current_principal_usd = curr_val_usd * 0.997 # Coste swap
+                    current_principal_usd = curr_val_usd * 0.997 # Coste swap
                 
-                new_width_pct, _ = self._calculate_dynamic_range(full_history_chrono, i, vol_days, sd_multiplier)
-                range_width_pct = new_width_pct 
+                    new_width_pct, _ = self._calculate_dynamic_range(full_history_chrono, i, vol_days, sd_multiplier, rolling, vol_estimator)
+                    range_width_pct = new_width_pct 
 
-                lower_price = p_native_t * (1 - range_width_pct)
-                upper_price = p_native_t * (1 + range_width_pct)
+                    lower_price = p_native_t * (1 - range_width_pct)
+                    upper_price = p_native_t * (1 + range_width_pct)
                 
-                liquidity, _, _ = self._calculate_liquidity_and_amounts(
-                    current_principal_usd, p_native_t, p_base_usd_t, lower_price, upper_price
-                )
-                rebalance_count += 1
-                in_range = True
+                    liquidity, _, _ = self._calculate_liquidity_and_amounts(
+                        current_principal_usd, p_native_t, p_base_usd_t, lower_price, upper_price
+                    )
+                    rebalance_count += 1
+                    in_range = True
             
-            # --- B. Valoración ---
-            curr_x, curr_y = self.math.calculate_amounts(
-                liquidity, math.sqrt(p_native_t), math.sqrt(lower_price), math.sqrt(upper_price)
-            )
-            val_pos_usd = (curr_x * p_base_usd_t) + (curr_y * p_quote_usd_t)
+                # --- B. Valoración ---
+                curr_x, curr_y = self.math.calculate_amounts(
+                    liquidity, math.sqrt(p_native_t), math.sqrt(lower_price), math.sqrt(upper_price)
+                )
+                val_pos_usd = (curr_x * p_base_usd_t) + (curr_y * p_quote_usd_t)
             
-            # --- C. Fees (SIN MULTIPLICADOR) ---
-            apr_snapshot = snap.get('apr', 0)
-            fees_earned_period = 0.0
+                # --- C. Fees (SIN MULTIPLICADOR) ---
+                apr_snapshot = aprs[i]
+                fees_earned_period = 0.0
             
-            if in_range and apr_snapshot:
-                # APR Anual (ej: 88.49) -> Decimal (0.8849)
-                # Dividimos por 1095 (Periodos de 8h en un año)
-                yield_period_8h = (float(apr_snapshot) / 100.0) / 1095.0
+                if in_range and apr_snapshot:
+                    # APR Anual (ej: 88.49) -> Decimal (0.8849)
+                    # Dividimos por 1095 (Periodos de 8h en un año)
+                    yield_period_8h = (float(apr_snapshot) / 100.0) / 1095.0
                 
-                # Cálculo simple: Capital Actual * Yield del Periodo
-                fees_earned_period = val_pos_usd * yield_period_8h
-                accumulated_fees_usd += fees_earned_period
-            
-            # --- D. HODL ---
-            val_hodl_now = (hodl_x * p_base_usd_t) + (hodl_y * p_quote_usd_t)
+                    # Cálculo simple: Capital Actual * Yield del Periodo
+                    fees_earned_period = val_pos_usd * yield_period_8h
+                    accumulated_fees_usd += fees_earned_period
             
-            results.append({
-                "Date": self._parse_date(snap.get('date')),
-                "Price": p_native_t,
-                "Range Min": lower_price,
-                "Range Max": upper_price,
-                "Range Width %": range_width_pct * 100, 
-                "In Range": in_range,
-                "APR Period": float(apr_snapshot) if apr_snapshot else 0.0,
-                "Fees Period": fees_earned_period,
-                "Fees Acum": accumulated_fees_usd,
-                "Valor Principal": val_pos_usd,
-                "Valor Total": val_pos_usd + accumulated_fees_usd,
-                "HODL Value": val_hodl_now
-            })
+                # --- D. HODL ---
+                val_hodl_now = (hodl_x * p_base_usd_t) + (hodl_y * p_quote_usd_t)
             
+                results.append({
+                    "Date": dates[i],
+                    "Price": p_native_t,
+                    "Range Min": lower_price,
+                    "Range Max": upper_price,
+                    "Range Width %": range_width_pct * 100, 
+                    "In Range": in_range,
+                    "APR Period": float(apr_snapshot) if apr_snapshot else 0.0,
+                    "Fees Period": fees_earned_period,
+                    "Fees Acum": accumulated_fees_usd,
+                    "Valor Principal": val_pos_usd,
+                    "Valor Total": val_pos_usd + accumulated_fees_usd,
+                    "HODL Value": val_hodl_now
+                })
+            df = pd.DataFrame(results)
+            if len(df): df["Date"] = self._parse_dates(df["Date"].to_numpy())
+
         metadata = {
             "initial_volatility": initial_vol,
             "rebalances": rebalance_count,
@@ -174,4 +401,4 @@ class Backtester:
             "avg_efficiency": 1.0
         }
             
-        return pd.DataFrame(results), initial_min_p, initial_max_p, metadata
+        return df, initial_min_p, initial_max_p, metadata
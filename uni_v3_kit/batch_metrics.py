@@ -0,0 +1,97 @@
+import math
+import numpy as np
+
+from .math_core import V3Math
+from .pool_history import PoolHistory
+
+# Mismo valor por defecto que V3Math.calculate_realized_volatility
+DEFAULT_VOL = 0.80
+
+
+def pad_columns(histories, column, n_rows):
+    """
+    Apila la columna `column` de los primeros `n_rows` snapshots de cada
+    historial en una matriz (pools x n_rows) rellena con NaN.
+    """
+    out = np.full((len(histories), n_rows), np.nan)
+    for i, h in enumerate(histories):
+        values = getattr(h, column)[:n_rows]
+        out[i, :len(values)] = values
+    return out
+
+
+def pack_valid(values):
+    """Mueve los valores no-NaN de cada fila a la izquierda (orden estable). Devuelve (matriz, nº válidos)."""
+    mask = ~np.isnan(values)
+    order = np.argsort(~mask, axis=1, kind='stable')
+    return np.take_along_axis(values, order, axis=1), mask.sum(axis=1)
+
+
+def batch_realized_volatility(prices):
+    """
+    Volatilidad anualizada por fila, equivalente a calculate_realized_volatility
+    sobre los precios válidos de cada fila (NaN = sin precio).
+    """
+    packed, n_valid = pack_valid(prices)
+    if packed.shape[1] < 2:
+        return np.full(len(prices), DEFAULT_VOL)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        returns = np.diff(np.log(packed), axis=1)
+        valid = np.arange(returns.shape[1])[None, :] < (n_valid - 1)[:, None]
+        m = np.maximum(n_valid - 1, 1)
+        r = np.where(valid, returns, 0.0)
+        mean = r.sum(axis=1) / m
+        dev = np.where(valid, returns - mean[:, None], 0.0)
+        std = np.sqrt((dev * dev).sum(axis=1) / m)
+
+    vol = std * math.sqrt(365)
+    return np.where(n_valid < 5, DEFAULT_VOL, vol)
+
+
+def batch_pool_metrics(histories, days_window, sd_multiplier=1.0):
+    """
+    Métricas de MarketScanner._process_pool_data para muchos pools a la vez.
+    `histories` es una lista de PoolHistory; devuelve un dict de arrays (uno
+    por métrica) y la máscara `valid` de pools con historial.
+    """
+    histories = [PoolHistory.coerce(h) for h in histories]
+    recent_rows = max(days_window, 30) * 3
+    window_rows = days_window * 3
+
+    # --- Matrices rellenas + máscara de validez ---
+    aprs = pad_columns(histories, 'apr', window_rows)
+    prices = pad_columns(histories, 'price', recent_rows)
+    valid = np.array([len(h) > 0 for h in histories], dtype=bool)
+
+    # --- 1. APR Promedio ---
+    apr_count = (~np.isnan(aprs)).sum(axis=1)
+    apr_sum = np.nansum(aprs, axis=1)
+    apr_mean = np.where(apr_count > 0, apr_sum / np.maximum(apr_count, 1) / 100.0, 0.0)
+
+    # --- 2. Volatilidad ---
+    vol_annual = batch_realized_volatility(prices)
+
+    # --- 3. Rango y Probabilidad ---
+    time_scaling = math.sqrt(days_window / 365.0)
+    range_width = np.clip(vol_annual * time_scaling * sd_multiplier, 0.005, 2.0)
+    prob_in_range = math.erf(sd_multiplier / math.sqrt(2))
+
+    # --- 4. Fees vs IL ---
+    probable_yield = apr_mean * (days_window / 365.0) * prob_in_range
+    il = V3Math.calculate_v3_il_at_limit(range_width)
+
+    # --- 5. Métricas de decisión ---
+    margen = probable_yield - il
+    ratio = probable_yield / np.maximum(il, 0.0001)
+
+    return {
+        "valid": valid,
+        "apr": apr_mean,
+        "vol": vol_annual,
+        "range_width": range_width,
+        "probable_yield": probable_yield,
+        "il": il,
+        "ratio": ratio,
+        "margen": margen,
+    }
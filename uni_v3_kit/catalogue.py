@@ -0,0 +1,127 @@
+import hashlib
+import json
+import threading
+import time
+
+from .pool_index import PoolIndex
+
+
+def pool_id(pool):
+    """Identificador de un pool en el listado (mismo criterio que el escáner)."""
+    return pool.get('pairAddress') or pool.get('_id')
+
+
+class PoolsDiff:
+    """Cambios entre dos versiones del listado (listas de ids de pool)."""
+
+    def __init__(self, added=None, removed=None, changed=None):
+        self.added = added or []
+        self.removed = removed or []
+        self.changed = changed or []
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+
+    def __repr__(self):
+        return f"PoolsDiff(added={len(self.added)}, removed={len(self.removed)}, changed={len(self.changed)})"
+
+
+class PoolCatalogue:
+    """
+    Último listado de /pools conocido por el proceso.
+    Se revalida con ETag / If-Modified-Since; si el servidor no envía
+    validadores, un hash del cuerpo evita volver a parsear un listado idéntico.
+    """
+
+    def __init__(self, revalidate_after=60):
+        self.revalidate_after = revalidate_after
+        self.pools = []
+        self.by_id = {}
+        self.etag = None
+        self.last_modified = None
+        self.content_hash = None
+        self.fetched_at = 0.0
+        self.version = 0
+        self.last_diff = PoolsDiff()
+        self._index = None
+        self._lock = threading.Lock()
+
+    @property
+    def index(self):
+        """PoolIndex del listado actual (se construye una vez por versión)."""
+        index = self._index
+        if index is None or index[0] != self.version:
+            with self._lock:
+                index = self._index
+                if index is None or index[0] != self.version:
+                    index = self._index = (self.version, PoolIndex(self.pools))
+        return index[1]
+
+    def is_fresh(self):
+        return self.version > 0 and (time.time() - self.fetched_at) < self.revalidate_after
+
+    def _conditional_headers(self):
+        headers = {}
+        if self.etag: headers['If-None-Match'] = self.etag
+        if self.last_modified: headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def refresh(self, http, endpoint, headers=None, force=False):
+        """
+        Revalida el listado y devuelve un PoolsDiff (vacío si no hubo cambios).
+        Los errores de red se propagan; el listado anterior se conserva.
+        """
+        with self._lock:
+            if not force and self.is_fresh():
+                return PoolsDiff()
+
+            request_headers = dict(headers or {})
+            if self.version > 0:
+                request_headers.update(self._conditional_headers())
+
+            response = http.get(endpoint, headers=request_headers)
+            if response.status_code == 304:
+                self.fetched_at = time.time()
+                return PoolsDiff()
+            response.raise_for_status()
+
+            body = response.content
+            content_hash = hashlib.sha1(body).hexdigest()
+            self.etag = response.headers.get('ETag')
+            self.last_modified = response.headers.get('Last-Modified')
+            self.fetched_at = time.time()
+            if content_hash == self.content_hash:
+                return PoolsDiff()
+
+            pools = json.loads(body).get('pools', [])
+            diff = self._apply(pools)
+            self.content_hash = content_hash
+            return diff
+
+    def _apply(self, pools):
+        new_by_id = {}
+        for p in pools:
+            new_by_id[pool_id(p)] = p
+
+        old_by_id = self.by_id
+        added = [k for k in new_by_id if k not in old_by_id]
+        removed = [k for k in old_by_id if k not in new_by_id]
+        changed = [k for k, p in new_by_id.items() if k in old_by_id and old_by_id[k] != p]
+
+        self.pools = pools
+        self.by_id = new_by_id
+        self.version += 1
+        self.last_diff = PoolsDiff(added, removed, changed)
+        return self.last_diff
+
+
+_catalogues = {}
+_catalogues_lock = threading.Lock()
+
+
+def get_catalogue(base_url):
+    """Un catálogo por API base, compartido por todo el proceso."""
+    with _catalogues_lock:
+        if base_url not in _catalogues:
+            _catalogues[base_url] = PoolCatalogue()
+        return _catalogues[base_url]
@@ -1,48 +1,150 @@
-import requests
-import time
+from .transport import get_shared_transport
+from .history_store import get_shared_store
+from .pool_history import PoolHistory
+from .singleflight import shared_flight
+from .catalogue import get_catalogue, PoolsDiff
+from .pool_stream import iter_json_array, normalize_pool
+from .iv_service import ImpliedVolService, get_iv_service
 
 class DataProvider:
-    def __init__(self):
+    def __init__(self, transport=None, store=None, flight=None, iv_service=None):
         self.headers = {'User-Agent': 'Mozilla/5.0'}
         self.base_url = "https://apiindex.mucho.finance"
+        # Sesión keep-alive compartida por todo el proceso (reutiliza conexiones TCP/TLS)
+        self.http = transport or get_shared_transport()
+        # Caché persistente de historiales (None = sin caché)
+        self.store = store if store is not None else get_shared_store()
+        # Peticiones idénticas concurrentes (entre sesiones) comparten una sola descarga
+        self.flight = flight or shared_flight
+        # IV de Deribit con caché (serie completa por divisa)
+        if iv_service is None:
+            iv_service = ImpliedVolService(http=transport) if transport else get_iv_service()
+        self.iv = iv_service
 
     def get_market_iv(self, currency="ETH"):
-        """Obtiene IV desde Deribit (DVOL)"""
-        try:
-            url = "https://www.deribit.com/api/v2/public/get_volatility_index_data"
-            params = {
-                "currency": currency.upper(),
-                "resolution": "1D",
-                "end_timestamp": int(time.time()*1000)
-            }
-            data = requests.get(url, params=params).json()
-            return data['result']['data'][-1][4] / 100.0
-        except Exception as e:
-            print(f"Error Deribit: {e}")
-            return 0.55 
+        """Obtiene IV desde Deribit (DVOL), cacheada por divisa en el servicio de IV"""
+        return self.iv.get_iv(currency)
+
+    @property
+    def catalogue(self):
+        """Último listado de /pools (compartido por proceso y por API base)."""
+        return get_catalogue(self.base_url)
 
     def get_all_pools(self):
         """API 1: Listado general"""
+        self.refresh_pools()
+        return list(self.catalogue.pools)
+
+    def get_pool_index(self):
+        """Índice (token / red / TVL) sobre el listado, reconstruido solo cuando cambia."""
+        self.refresh_pools()
+        return self.catalogue.index
+
+    def refresh_pools(self, force=False):
+        """
+        Revalida el listado (ETag / If-Modified-Since / hash del cuerpo) y
+        devuelve un PoolsDiff con los pools añadidos, eliminados y modificados.
+        """
         endpoint = f"{self.base_url}/pools"
         try:
-            response = requests.get(endpoint, headers=self.headers)
-            return response.json().get('pools', [])
+            return self.flight.do(endpoint, self.catalogue.refresh, self.http, endpoint, self.headers, force)
         except Exception as e:
-            return []
+            # Se mantiene el último listado conocido
+            print(f"Error actualizando listado de pools: {e}")
+            return PoolsDiff()
 
-    def get_pool_history(self, pool_address):
+    def iter_pools(self, predicate=None, chunk_size=65536):
+        """
+        Listado en streaming: genera los pools uno a uno desde el cuerpo de la
+        respuesta, ya normalizados, y descarta al vuelo los que no cumplen `predicate`.
+        """
+        endpoint = f"{self.base_url}/pools"
+        try:
+            response = self.http.get(endpoint, headers=self.headers, stream=True)
+            response.raise_for_status()
+            try:
+                for pool in iter_json_array(response.iter_content(chunk_size), 'pools'):
+                    record = normalize_pool(pool)
+                    if predicate is None or predicate(record):
+                        yield record
+            finally:
+                response.close()
+        except Exception as e:
+            print(f"Error leyendo listado de pools: {e}")
+
+    def get_pool_history(self, pool_address, timeout=None):
         """
         API 2: Devuelve el OBJETO COMPLETO del pool (info + history)
-        Actualizado para usar la ruta: /pools/{address}/history
+        Usa la caché local si está fresca; si no, descarga y fusiona los snapshots nuevos.
+        El campo 'history' se entrega como PoolHistory (columnar).
         """
+        endpoint = f"{self.base_url}/pools/{pool_address}/history"
+        pool = self.flight.do(endpoint, self._build_pool_history, pool_address, timeout)
+        # Copia superficial: el PoolHistory (solo-lectura) se comparte entre llamadas
+        return dict(pool) if pool else {}
+
+    def refresh_pool_history(self, pool_address, timeout=None):
+        """
+        Descarga el historial ignorando el TTL y lo fusiona en la caché (warmer).
+        Devuelve True solo si la descarga trajo datos (sin fallback a la caché antigua).
+        """
+        endpoint = f"{self.base_url}/pools/{pool_address}/history"
+        return self.flight.do(f"{endpoint}#refresh", self._refresh_pool_history, pool_address, timeout)
+
+    def _refresh_pool_history(self, pool_address, timeout=None):
+        pool = self._fetch_pool_history(pool_address, timeout)
+        if not pool: return False
+        if self.store is not None:
+            try:
+                self.store.merge(pool_address, pool)
+            except Exception as e:
+                print(f"Error actualizando caché del pool {pool_address}: {e}")
+                return False
+        return True
+
+    def _build_pool_history(self, pool_address, timeout=None, force=False):
+        pool = self._load_pool_history(pool_address, timeout, force)
+        if not pool: return {}
+
+        pool = dict(pool)
+        pool['history'] = PoolHistory.from_records(pool.get('history'))
+        return pool
+
+    def _load_pool_history(self, pool_address, timeout=None, force=False):
+        """Objeto pool con 'history' como lista de dicts (caché o red)."""
+        if self.store is not None and not force:
+            try:
+                if self.store.is_fresh(pool_address):
+                    cached = self.store.load(pool_address)
+                    if cached: return cached
+            except Exception as e:
+                print(f"Error leyendo caché del pool {pool_address}: {e}")
+
+        pool = self._fetch_pool_history(pool_address, timeout)
+
+        if self.store is not None:
+            try:
+                if pool:
+                    if self.store.merge(pool_address, pool):
+                        return self.store.load(pool_address) or pool
+                else:
+                    # Sin red: mejor datos antiguos que nada
+                    stale = self.store.load(pool_address)
+                    if stale: return stale
+            except Exception as e:
+                print(f"Error actualizando caché del pool {pool_address}: {e}")
+        return pool
+
+    def _fetch_pool_history(self, pool_address, timeout=None):
+        """Descarga /pools/{address}/history"""
         # CAMBIO REALIZADO AQUÍ: Inyectamos la address en la URL
         endpoint = f"{self.base_url}/pools/{pool_address}/history"
-        
+
         try:
             # Ya no necesitamos pasar 'params={"id":...}'
-            response = requests.get(endpoint, headers=self.headers)
+            response = self.http.get(endpoint, headers=self.headers, timeout=timeout)
             data = response.json()
-            
+
             # Mantenemos la lógica de extracción original
             if "pool" in data and data["pool"]:
                 return data["pool"]
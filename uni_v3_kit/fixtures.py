@@ -0,0 +1,248 @@
+"""
+Modo grabación / reproducción de respuestas externas (mucho.finance, Deribit, Yahoo).
+
+Se activa con variables de entorno, sin tocar analyzer ni backtester (las páginas
+que usan yfinance llaman a `activate_from_env()` al importar):
+
+    UNI_V3_FIXTURE_MODE=record|replay
+    UNI_V3_FIXTURE_DIR=./fixtures          (por defecto)
+    UNI_V3_FIXTURE_LATENCY_MS=120          (latencia inyectada en replay, opcional)
+
+En `record` cada respuesta HTTP del DataProvider y cada llamada a yfinance se
+guarda comprimida (gzip) en el directorio; en `replay` se sirven desde disco y
+una petición no grabada falla como un error de red. Las fechas de yfinance
+relativas a hoy (`start=date.today() - ...`, `end=date.today()`) se normalizan en
+la clave para que la reproducción funcione otro día.
+"""
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+
+import pandas as pd
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# Parámetros que cambian en cada llamada y no deben formar parte de la clave
+VOLATILE_PARAMS = {'start_timestamp', 'end_timestamp'}
+# Revalidación HTTP: se quitan al grabar para guardar siempre la respuesta completa
+CONDITIONAL_HEADERS = {'if-none-match', 'if-modified-since'}
+
+
+class FixtureMissingError(requests.ConnectionError):
+    """No hay grabación para la petición en modo replay."""
+
+
+def fixture_key(*parts):
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _atomic_write(path, chunks):
+    """Escribe gzip en un temporal y renombra (varios hilos pueden grabar a la vez)."""
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with gzip.open(tmp, "wb") as f:
+        for chunk in chunks:
+            f.write(chunk)
+    os.replace(tmp, path)
+
+
+class FixtureTransport:
+    """
+    Envoltorio de HttpTransport con la misma interfaz (get / get_json / stats).
+    Formato de fichero: 1ª línea JSON con status y cabeceras, resto = cuerpo crudo.
+    """
+
+    def __init__(self, inner, mode, directory, latency=0.0):
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"Modo de fixtures desconocido: {mode}")
+        self.inner = inner
+        self.mode = mode
+        self.directory = os.path.join(directory, "http")
+        self.latency = latency
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._recorded = 0
+
+    def _path(self, url, params):
+        params = {k: v for k, v in (params or {}).items() if k not in VOLATILE_PARAMS}
+        return os.path.join(self.directory, fixture_key("GET", url, params) + ".gz")
+
+    def get(self, url, params=None, headers=None, timeout=None, stream=False):
+        path = self._path(url, params)
+        if self.mode == 'replay':
+            return self._replay(path, url)
+
+        # Sin cabeceras condicionales: un 304 (cuerpo vacío) no sirve como grabación
+        headers = {k: v for k, v in (headers or {}).items() if k.lower() not in CONDITIONAL_HEADERS} or None
+        response = self.inner.get(url, params=params, headers=headers, timeout=timeout)
+        if not response.ok and os.path.exists(path):
+            # Un error no sustituye a una grabación buena
+            return response
+        meta = {"url": url, "status": response.status_code, "headers": dict(response.headers)}
+        # El cuerpo ya viene descomprimido; quitamos la cabecera para no confundir al lector
+        meta["headers"].pop("Content-Encoding", None)
+        meta["headers"].pop("Content-Length", None)
+        _atomic_write(path, [json.dumps(meta).encode() + b"\n", response.content])
+        with self._lock:
+            self._recorded += 1
+        return response
+
+    def _replay(self, path, url):
+        if self.latency: time.sleep(self.latency)
+        try:
+            with gzip.open(path, "rb") as f:
+                meta = json.loads(f.readline())
+                body = f.read()
+        except FileNotFoundError:
+            with self._lock:
+                self._misses += 1
+            raise FixtureMissingError(f"Sin fixture para {url}")
+
+        with self._lock:
+            self._hits += 1
+        response = requests.Response()
+        response.status_code = meta["status"]
+        response.headers = CaseInsensitiveDict(meta["headers"])
+        response.url = meta["url"]
+        response.encoding = "utf-8"
+        response._content = body
+        response._content_consumed = True
+        return response
+
+    def get_json(self, url, params=None, headers=None, timeout=None):
+        response = self.get(url, params=params, headers=headers, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def stats(self):
+        stats = self.inner.stats() if self.mode == 'record' else {}
+        with self._lock:
+            stats.update({
+                "fixture_mode": self.mode,
+                "fixture_hits": self._hits,
+                "fixture_misses": self._misses,
+                "fixture_recorded": self._recorded,
+            })
+        return stats
+
+    def reset_stats(self):
+        self.inner.reset_stats()
+
+    def close(self):
+        self.inner.close()
+
+
+# --- yfinance ---
+
+# Argumentos de fecha de yfinance; las páginas los calculan a partir de hoy
+DATE_KWARGS = ('start', 'end')
+
+
+def _as_date(value):
+    try:
+        return pd.Timestamp(value).date()
+    except (TypeError, ValueError):
+        return None
+
+
+def _date_keys(kwargs):
+    """
+    Dos variantes de los kwargs para la clave: fechas absolutas y fechas en días
+    relativos a hoy (`start=date.today() - timedelta(...)` cambia cada día). Un
+    `end` de hoy o posterior significa "hasta ahora" y se quita de ambas.
+    """
+    today = datetime.date.today()
+    absolute, relative = dict(kwargs), dict(kwargs)
+    for name in DATE_KWARGS:
+        if kwargs.get(name) is None: continue
+        day = _as_date(kwargs[name])
+        if day is None: continue
+        if name == 'end' and day >= today:
+            del absolute[name], relative[name]
+            continue
+        absolute[name] = day.isoformat()
+        relative[name] = f"today{(day - today).days:+d}d"
+    return absolute, relative
+
+
+def _recorded_call(paths, call, mode, latency):
+    """
+    Ejecuta y guarda (record) o carga desde disco (replay) un resultado picklable.
+    En replay se usa la primera clave de `paths` que exista; en record se escriben todas.
+    """
+    if mode == 'replay':
+        if latency: time.sleep(latency)
+        for path in paths:
+            if os.path.exists(path):
+                with gzip.open(path, "rb") as f:
+                    return pickle.load(f)
+        raise FixtureMissingError(f"Sin fixture yfinance: {os.path.basename(paths[0])}")
+    result = call()
+    data = pickle.dumps(result)
+    for path in paths:
+        _atomic_write(path, [data])
+    return result
+
+
+def install_yfinance(mode, directory, latency=0.0):
+    """Intercepta yfinance.download y Ticker.history (las páginas llaman a `yf.download`)."""
+    try:
+        import yfinance
+    except ImportError:
+        return False
+    if getattr(yfinance.download, "__wrapped__", None) is not None:
+        return True
+
+    directory = os.path.join(directory, "yfinance")
+    os.makedirs(directory, exist_ok=True)
+    download = yfinance.download
+    ticker_history = yfinance.Ticker.history
+
+    def _paths(name, args, kwargs):
+        kwargs = {k: v for k, v in kwargs.items() if k != 'progress'}
+        return [os.path.join(directory, fixture_key(name, args, variant) + ".pkl.gz") for variant in _date_keys(kwargs)]
+
+    def download_fixture(*args, **kwargs):
+        paths = _paths("download", args, kwargs)
+        return _recorded_call(paths, lambda: download(*args, **kwargs), mode, latency)
+
+    def history_fixture(self, *args, **kwargs):
+        paths = _paths("Ticker.history", (self.ticker,) + args, kwargs)
+        return _recorded_call(paths, lambda: ticker_history(self, *args, **kwargs), mode, latency)
+
+    download_fixture.__wrapped__ = download
+    history_fixture.__wrapped__ = ticker_history
+    yfinance.download = download_fixture
+    yfinance.Ticker.history = history_fixture
+    return True
+
+
+# --- Activación por entorno ---
+
+def fixture_config():
+    """(mode, directory, latency_s) desde el entorno, o None si está desactivado."""
+    mode = os.environ.get("UNI_V3_FIXTURE_MODE", "").strip().lower()
+    if not mode: return None
+    directory = os.environ.get("UNI_V3_FIXTURE_DIR", "fixtures")
+    latency = float(os.environ.get("UNI_V3_FIXTURE_LATENCY_MS", 0) or 0) / 1000.0
+    return mode, directory, latency
+
+
+def wrap_from_env(transport):
+    config = fixture_config()
+    if config is None: return transport
+    mode, directory, latency = config
+    return FixtureTransport(transport, mode, directory, latency)
+
+
+def activate_from_env():
+    """Instala las fixtures de yfinance si UNI_V3_FIXTURE_MODE está definido (las páginas lo llaman al importar)."""
+    config = fixture_config()
+    if config is None: return False
+    return install_yfinance(*config)
@@ -0,0 +1,96 @@
+import itertools
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from .backtester import Backtester
+from .pool_history import PoolHistory
+
+PARAMS = ("sd_multiplier", "vol_days", "sim_days", "auto_rebalance")
+COLUMNS = list(PARAMS) + ["Valor Final", "Fees Totales", "Rebalanceos", "HODL Value", "ROI %", "vs HODL %"]
+
+# Historial del pool en cada proceso (se envía una sola vez, en el initializer)
+_worker_history = None
+
+
+def _init_worker(history):
+    global _worker_history
+    _worker_history = history
+
+
+def _run_chunk(tasks, investment_usd, fee_tier):
+    tester = Backtester(cache=False)
+    return [summarize_run(tester, _worker_history[offset:], investment_usd, fee_tier, *c) for offset, c in tasks]
+
+
+def summarize_run(tester, history, investment_usd, fee_tier, sd_multiplier, vol_days, sim_days, auto_rebalance):
+    """Una simulación resumida en una fila (valor final, fees, rebalanceos, vs HODL)."""
+    row = dict(zip(PARAMS, (sd_multiplier, vol_days, sim_days, auto_rebalance)))
+    res = tester.run_simulation(history, investment_usd, sd_multiplier, sim_days=sim_days, vol_days=vol_days,
+                                fee_tier=fee_tier, auto_rebalance=auto_rebalance)
+    if res is None or res[0].empty:
+        row.update({"Valor Final": math.nan, "Fees Totales": math.nan, "Rebalanceos": 0,
+                    "HODL Value": math.nan, "ROI %": math.nan, "vs HODL %": math.nan})
+        return row
+
+    df, _, _, meta = res
+    final = float(df['Valor Total'].iat[-1])
+    hodl = float(df['HODL Value'].iat[-1])
+    row.update({
+        "Valor Final": final,
+        "Fees Totales": float(df['Fees Acum'].iat[-1]),
+        "Rebalanceos": meta['rebalances'],
+        "HODL Value": hodl,
+        "ROI %": (final - investment_usd) / investment_usd * 100,
+        "vs HODL %": (final - hodl) / investment_usd * 100,
+    })
+    return row
+
+
+def run_tasks(history, tasks, investment_usd, fee_tier, max_workers=None):
+    """
+    summarize_run para cada tarea (offset, combo) en un pool de procesos; la
+    simulación usa history[offset:] (offset en snapshots desde el más reciente).
+    El historial se envía una vez a cada proceso en su initializer. Devuelve las
+    filas en el orden de `tasks`; si el pool falla se sigue en serie.
+    """
+    workers = max_workers or os.cpu_count() or 1
+    workers = max(1, min(workers, len(tasks)))
+
+    if workers > 1:
+        # Varios bloques por proceso para repartir bien las simulaciones lentas (con rebalanceo)
+        n_chunks = workers * 4
+        chunks = [range(k, len(tasks), n_chunks) for k in range(min(n_chunks, len(tasks)))]
+        try:
+            # spawn: hacer fork desde el servidor de Streamlit (multihilo) puede dejar locks tomados
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                     initializer=_init_worker, initargs=(history,)) as pool:
+                futures = [pool.submit(_run_chunk, [tasks[i] for i in chunk], investment_usd, fee_tier) for chunk in chunks]
+                # Se recoloca cada fila en el orden de las tareas (ranking determinista)
+                rows = [None] * len(tasks)
+                for chunk, f in zip(chunks, futures):
+                    for i, row in zip(chunk, f.result()):
+                        rows[i] = row
+                return rows
+        except Exception as e:
+            print(f"Error en el pool de procesos, se sigue en serie: {e}")
+
+    tester = Backtester(cache=False)
+    return [summarize_run(tester, history[offset:], investment_usd, fee_tier, *c) for offset, c in tasks]
+
+
+def grid_search(history, investment_usd=10000.0, sd_multipliers=(0.5, 1.0, 1.5, 2.0), vol_days=(3, 7, 14, 30),
+                sim_days=(30,), auto_rebalance=(False, True), fee_tier=0.003, max_workers=None, rank_by="Valor Final"):
+    """
+    Backtest de un pool sobre el producto cartesiano de parámetros, repartido en
+    un pool de procesos. El historial se parsea una vez y cada proceso lo recibe
+    en su initializer. Devuelve una tabla ordenada por `rank_by` (mejor primero).
+    """
+    history = PoolHistory.coerce(history)
+    combos = list(itertools.product(sd_multipliers, vol_days, sim_days, auto_rebalance))
+    rows = run_tasks(history, [(0, c) for c in combos], investment_usd, fee_tier, max_workers)
+    table = pd.DataFrame(rows, columns=COLUMNS)
+    return table.sort_values(rank_by, ascending=False, na_position='last', kind='stable').reset_index(drop=True)
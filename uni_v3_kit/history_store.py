@@ -0,0 +1,165 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_DIR = os.path.join(os.path.expanduser("~"), ".cache", "uni_v3_kit")
+DEFAULT_TTL = 3600  # segundos
+DEFAULT_MAX_SNAPSHOTS = 2 * 365 * 3  # Retención: 2 años de snapshots de 8h por pool
+
+
+class HistoryStore:
+    """
+    Almacén persistente (SQLite) de historiales de pools, indexado por address.
+    Guarda la info del pool y cada snapshot de 8h por separado, de modo que un
+    refresco solo añade los snapshots posteriores al último `date` almacenado.
+    Por pool se conservan solo los `max_snapshots` más recientes (None = sin límite).
+    """
+
+    def __init__(self, path=None, ttl=DEFAULT_TTL, max_snapshots=DEFAULT_MAX_SNAPSHOTS):
+        if path is None:
+            path = os.path.join(os.environ.get("UNI_V3_CACHE_DIR", DEFAULT_DIR), "pool_history.sqlite")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.ttl = ttl
+        self.max_snapshots = max_snapshots
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._init_schema()
+
+    def _conn(self):
+        # Una conexión por hilo (el escáner consulta desde un pool de hilos)
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._conn()
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS pools (
+                    address TEXT PRIMARY KEY,
+                    info TEXT NOT NULL,
+                    fetched_at REAL NOT NULL
+                )""")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS snapshots (
+                    address TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    PRIMARY KEY (address, date)
+                ) WITHOUT ROWID""")
+
+    @staticmethod
+    def _key(address):
+        return str(address).lower()
+
+    def fetched_at(self, address):
+        row = self._conn().execute(
+            "SELECT fetched_at FROM pools WHERE address = ?", (self._key(address),)
+        ).fetchone()
+        return row[0] if row else None
+
+    def is_fresh(self, address):
+        ts = self.fetched_at(address)
+        return ts is not None and (time.time() - ts) < self.ttl
+
+    def latest_date(self, address):
+        row = self._conn().execute(
+            "SELECT MAX(date) FROM snapshots WHERE address = ?", (self._key(address),)
+        ).fetchone()
+        return row[0] if row else None
+
+    def load(self, address):
+        """Devuelve el objeto pool (info + history, más reciente primero) o None."""
+        conn = self._conn()
+        key = self._key(address)
+        row = conn.execute("SELECT info FROM pools WHERE address = ?", (key,)).fetchone()
+        if not row: return None
+
+        pool = json.loads(row[0])
+        rows = conn.execute(
+            "SELECT payload FROM snapshots WHERE address = ? ORDER BY date DESC LIMIT ?",
+            (key, self.max_snapshots if self.max_snapshots else -1)
+        ).fetchall()
+        pool['history'] = [json.loads(r[0]) for r in rows]
+        return pool
+
+    def merge(self, address, pool):
+        """
+        Guarda la info del pool e inserta solo los snapshots más nuevos que el
+        último `date` almacenado. Devuelve False si el historial no es cacheable.
+        """
+        history = pool.get('history') or []
+        if any(snap.get('date') is None for snap in history):
+            return False
+
+        key = self._key(address)
+        info = {k: v for k, v in pool.items() if k != 'history'}
+
+        with self._write_lock:
+            conn = self._conn()
+            last = self.latest_date(address)
+            new_rows = [
+                (key, str(snap['date']), json.dumps(snap))
+                for snap in history
+                if last is None or str(snap['date']) > last
+            ]
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO pools (address, info, fetched_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(info), time.time())
+                )
+                conn.executemany(
+                    "INSERT OR IGNORE INTO snapshots (address, date, payload) VALUES (?, ?, ?)",
+                    new_rows
+                )
+                if self.max_snapshots and new_rows:
+                    # Retención: se borra lo anterior al N-ésimo snapshot más reciente
+                    conn.execute(
+                        """DELETE FROM snapshots WHERE address = ? AND date < (
+                               SELECT date FROM snapshots WHERE address = ?
+                               ORDER BY date DESC LIMIT 1 OFFSET ?)""",
+                        (key, key, self.max_snapshots - 1)
+                    )
+        return True
+
+    def clear(self):
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                conn.execute("DELETE FROM snapshots")
+                conn.execute("DELETE FROM pools")
+
+
+_shared_store = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_store():
+    """
+    Almacén por defecto del proceso. Se desactiva con UNI_V3_HISTORY_CACHE=0;
+    el TTL se ajusta con UNI_V3_HISTORY_TTL (segundos) y la retención por pool con
+    UNI_V3_HISTORY_MAX_SNAPSHOTS (0 = sin límite).
+    """
+    global _shared_store
+    if os.environ.get("UNI_V3_HISTORY_CACHE", "1") == "0":
+        return None
+    # Con fixtures (record/replay) todo debe pasar por el transporte: sin caché en disco
+    if os.environ.get("UNI_V3_FIXTURE_MODE"):
+        return None
+    with _shared_lock:
+        if _shared_store is None:
+            try:
+                ttl = float(os.environ.get("UNI_V3_HISTORY_TTL", DEFAULT_TTL))
+                max_snapshots = int(os.environ.get("UNI_V3_HISTORY_MAX_SNAPSHOTS", DEFAULT_MAX_SNAPSHOTS))
+                _shared_store = HistoryStore(ttl=ttl, max_snapshots=max_snapshots or None)
+            except Exception as e:
+                print(f"Error abriendo caché de historiales: {e}")
+                return None
+        return _shared_store
@@ -0,0 +1,140 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .singleflight import shared_flight
+from .transport import get_shared_transport
+
+DERIBIT_DVOL_URL = "https://www.deribit.com/api/v2/public/get_volatility_index_data"
+FALLBACK_IV = 0.55
+
+
+class _Series:
+    __slots__ = ('timestamps', 'close', 'fetched_at')
+
+    def __init__(self, timestamps, close, fetched_at):
+        self.timestamps = timestamps
+        self.close = close
+        self.fetched_at = fetched_at
+
+
+class ImpliedVolService:
+    """
+    IV de mercado desde Deribit (DVOL diario) con caché por divisa.
+    Guarda la serie completa (no solo el último cierre) para que las
+    estadísticas móviles salgan gratis, y refresca varias divisas a la vez.
+    """
+
+    def __init__(self, http=None, ttl=3600, lookback_days=365, fallback=FALLBACK_IV, max_workers=4):
+        self.http = http or get_shared_transport()
+        self.ttl = ttl
+        self.lookback_days = lookback_days
+        self.fallback = fallback
+        self.max_workers = max_workers
+        self._series = {}
+        self._lock = threading.Lock()
+        self._fetches = 0
+        self._errors = 0
+
+    def _is_fresh(self, currency):
+        series = self._series.get(currency)
+        return series is not None and (time.time() - series.fetched_at) < self.ttl
+
+    def _fetch(self, currency):
+        end = int(time.time() * 1000)
+        params = {
+            "currency": currency,
+            "resolution": "1D",
+            "start_timestamp": end - self.lookback_days * 86400 * 1000,
+            "end_timestamp": end,
+        }
+        data = self.http.get(DERIBIT_DVOL_URL, params=params).json()
+        rows = np.asarray(data['result']['data'], dtype=float)
+        if rows.ndim != 2 or not len(rows):
+            raise ValueError(f"Serie DVOL vacía para {currency}")
+        rows = rows[np.argsort(rows[:, 0])]
+
+        # Columnas: [timestamp, open, high, low, close] (DVOL en %)
+        series = _Series(rows[:, 0].astype(np.int64), rows[:, 4] / 100.0, time.time())
+        series.timestamps.flags.writeable = False
+        series.close.flags.writeable = False
+        with self._lock:
+            self._series[currency] = series
+            self._fetches += 1
+        return series
+
+    def _refresh_one(self, currency, force=False):
+        if not force and self._is_fresh(currency): return True
+        try:
+            shared_flight.do(("dvol", currency), self._fetch, currency)
+            return True
+        except Exception as e:
+            print(f"Error Deribit: {e}")
+            with self._lock:
+                self._errors += 1
+            return False
+
+    def refresh(self, currencies, force=False):
+        """Refresca en un solo ciclo (en paralelo) las divisas caducadas."""
+        currencies = sorted({c.upper() for c in currencies})
+        stale = [c for c in currencies if force or not self._is_fresh(c)]
+        if not stale: return {}
+        workers = max(1, min(self.max_workers, len(stale)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(lambda c: self._refresh_one(c, force), stale)
+            return dict(zip(stale, results))
+
+    def get_series(self, currency="ETH"):
+        """(timestamps_ms, iv_decimal) ordenados cronológicamente, o None."""
+        currency = currency.upper()
+        self._refresh_one(currency)
+        series = self._series.get(currency)
+        if series is None: return None
+        return series.timestamps, series.close
+
+    def get_iv(self, currency="ETH"):
+        """Último cierre de DVOL en decimal; serie antigua o fallback si Deribit falla."""
+        series = self.get_series(currency)
+        if series is None: return self.fallback
+        return float(series[1][-1])
+
+    def rolling_stats(self, currency="ETH", window=30):
+        """Estadísticas de la IV en los últimos `window` días."""
+        series = self.get_series(currency)
+        if series is None: return None
+        close = series[1]
+        recent = close[-window:]
+        current = float(close[-1])
+        return {
+            "current": current,
+            "mean": float(recent.mean()),
+            "std": float(recent.std()),
+            "min": float(recent.min()),
+            "max": float(recent.max()),
+            # % de días de la ventana con IV por debajo de la actual
+            "percentile": float((recent < current).mean() * 100.0),
+        }
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            return {
+                "fetches": self._fetches,
+                "errors": self._errors,
+                "age_s": {c: now - s.fetched_at for c, s in self._series.items()},
+            }
+
+
+_shared_service = None
+_shared_lock = threading.Lock()
+
+
+def get_iv_service():
+    """Servicio de IV único por proceso."""
+    global _shared_service
+    with _shared_lock:
+        if _shared_service is None:
+            _shared_service = ImpliedVolService()
+        return _shared_service
@@ -1,6 +1,12 @@
 import math
 import numpy as np
 
+
+def _is_array(*values):
+    """True si algún argumento tiene dimensión (array, lista, Series de pandas...): camino vectorizado."""
+    return any(np.ndim(v) > 0 for v in values)
+
+
 class V3Math:
     @staticmethod
     def calculate_realized_volatility(price_history):
@@ -20,74 +26,61 @@ class V3Math:
     def calculate_il_risk_cost(volatility_annual):
         return (volatility_annual ** 2) / 2
 
-    # --- CÁLCULO EXACTO DE IL EN V3 (SIMULACIÓN) ---
+    # --- CÁLCULO EXACTO DE IL EN V3 (FORMA CERRADA) ---
+    @staticmethod
+    def calculate_v3_il_bounds(range_width_pct):
+        """
+        IL de Uniswap V3 (negativo) al tocar cada límite del rango P * (1 +/- width).
+        Es la simulación de una posición (valor en pool vs HODL) resuelta de forma
+        analítica: la liquidez se cancela y solo quedan las raíces de los límites.
+        Acepta un ancho o un array de anchos; devuelve (il_min, il_max).
+        Anchos >= 1 (límite inferior <= 0) o NaN dan 0.
+        """
+        width = np.asarray(range_width_pct, dtype=float)
+        w = np.maximum(width, 0.001)
+        ok = w < 1
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            sqrt_a = np.sqrt(np.where(ok, 1 - w, 0.5))
+            sqrt_b = np.sqrt(np.where(ok, 1 + w, 1.5))
+
+            # Tokens iniciales por unidad de liquidez con P_entry = 1
+            x0 = 1 - 1 / sqrt_b
+            y0 = 1 - sqrt_a
+
+            # Límite inferior: todo Token Base; valor = L * (sqrtB - sqrtA) / (sqrtA * sqrtB) * P_min
+            val_pool_min = (sqrt_b - sqrt_a) * sqrt_a / sqrt_b
+            val_hodl_min = x0 * sqrt_a * sqrt_a + y0
+            # Límite superior: todo Token Quote; valor = L * (sqrtB - sqrtA)
+            val_pool_max = sqrt_b - sqrt_a
+            val_hodl_max = x0 * sqrt_b * sqrt_b + y0
+
+            il_min = np.where(ok, val_pool_min / val_hodl_min - 1, 0.0)
+            il_max = np.where(ok, val_pool_max / val_hodl_max - 1, 0.0)
+
+        if width.ndim == 0:
+            return float(il_min), float(il_max)
+        return il_min, il_max
+
     @staticmethod
     def calculate_v3_il_at_limit(range_width_pct):
         """
-        Calcula el Impermanent Loss exacto de Uniswap V3 al tocar el límite del rango.
-        Simula una posición de 1000 USD y compara el valor final en el pool vs HODL.
+        Impermanent Loss de Uniswap V3 al tocar el límite del rango, como pérdida
+        positiva (ej 0.05 para 5%): el peor de los dos límites.
+        Acepta escalar (devuelve float) o array de anchos.
         """
-        try:
-            width = max(range_width_pct, 0.001)
-            
-            # 1. Definimos escenario normalizado
-            P_entry = 1.0
-            
-            # Rango simétrico porcentual: P * (1 +/- width)
-            P_min = P_entry * (1 - width)
-            P_max = P_entry * (1 + width)
-            
-            # 2. Inversión teórica de 1000 USD para simular
-            investment = 1000.0
-            
-            # 3. Calcular Liquidez (L) y Tokens Iniciales (HODL Stack) al entrar
-            # Usamos las fórmulas de V3 para obtener x0 (Base) e y0 (Quote)
-            L = V3Math.get_liquidity_for_amount(investment, P_entry, P_min, P_max)
-            
-            if L == 0: return 0.0
-            
-            # Tokens iniciales que compramos (x0=Base, y0=Quote)
-            x0, y0 = V3Math.calculate_amounts(L, math.sqrt(P_entry), math.sqrt(P_min), math.sqrt(P_max))
-            
-            # --- ESCENARIO A: El precio baja hasta P_min (Límite Inferior) ---
-            # En P_min, el pool se llena de Token Base (x). y = 0.
-            
-            # Valor HODL en P_min (nuestros tokens originales valorados a precio bajo)
-            val_hodl_min = (x0 * P_min) + y0
-            
-            # Valor POOL en P_min
-            # Calculamos qué tokens tenemos realmente en el pool a precio P_min
-            # (Todo X, nada Y)
-            x_min, y_min = V3Math.calculate_amounts(L, math.sqrt(P_min), math.sqrt(P_min), math.sqrt(P_max))
-            val_pool_min = (x_min * P_min) + y_min
-            
-            il_min = (val_pool_min - val_hodl_min) / val_hodl_min if val_hodl_min > 0 else 0
-            
-            # --- ESCENARIO B: El precio sube hasta P_max (Límite Superior) ---
-            # En P_max, el pool se llena de Token Quote (y). x = 0.
-            
-            # Valor HODL en P_max
-            val_hodl_max = (x0 * P_max) + y0
-            
-            # Valor POOL en P_max
-            # (Nada X, todo Y)
-            x_max, y_max = V3Math.calculate_amounts(L, math.sqrt(P_max), math.sqrt(P_min), math.sqrt(P_max))
-            val_pool_max = (x_max * P_max) + y_max
-            
-            il_max = (val_pool_max - val_hodl_max) / val_hodl_max if val_hodl_max > 0 else 0
-            
-            # Devolvemos la peor pérdida (máximo IL posible en el rango) en valor absoluto positivo
-            # Nota: IL siempre es negativo, devolvemos el % de pérdida como positivo (ej 0.05 para 5%)
-            return max(abs(il_min), abs(il_max))
-            
-        except Exception as e:
-            print(f"Error calculando IL: {e}")
-            return 0.0
+        il_min, il_max = V3Math.calculate_v3_il_bounds(range_width_pct)
+        return np.maximum(np.abs(il_min), np.abs(il_max)) if np.ndim(il_min) else max(abs(il_min), abs(il_max))
 
     # --- Fórmulas Oficiales Uniswap V3 ---
+    # Aceptan escalares (camino rápido, sin NumPy) o arrays que se difunden
+    # entre sí: precios, límites y liquidez de muchas posiciones/snapshots a la vez.
     @staticmethod
     def get_liquidity_for_amount(amount_usd, price_current, price_min, price_max):
         """Calcula L dado un valor en USD y el rango (Asumiendo P_quote = 1 USD)"""
+        if _is_array(amount_usd, price_current, price_min, price_max):
+            return V3Math._liquidity_for_amount_array(amount_usd, price_current, price_min, price_max)
+
         if price_current <= price_min or price_current >= price_max: return 0 
         
         sqrt_p = math.sqrt(price_current)
@@ -109,9 +102,24 @@ class V3Math:
         
         return amount_usd / cost_unit_usd
 
+    @staticmethod
+    def _liquidity_for_amount_array(amount_usd, price_current, price_min, price_max):
+        amount_usd, p, p_min, p_max = np.broadcast_arrays(*(np.asarray(v, dtype=float) for v in (amount_usd, price_current, price_min, price_max)))
+        out_of_range = (p <= p_min) | (p >= p_max)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            sqrt_p = np.sqrt(p)
+            sqrt_a = np.sqrt(p_min)
+            sqrt_b = np.sqrt(p_max)
+            cost_unit_usd = ((1/sqrt_p) - (1/sqrt_b)) * p + (sqrt_p - sqrt_a)
+            return np.where(out_of_range | (cost_unit_usd == 0), 0.0, amount_usd / cost_unit_usd)
+
     @staticmethod
     def calculate_amounts(liquidity, sqrt_p, sqrt_a, sqrt_b):
         """Calcula cantidad real de tokens x e y dado L y precios (Raíces)"""
+        if _is_array(liquidity, sqrt_p, sqrt_a, sqrt_b):
+            return V3Math._amounts_array(liquidity, sqrt_p, sqrt_a, sqrt_b)
+
         # Caso 1: Precio debajo del rango (P <= Pa) -> Todo es Token X (Base)
         if sqrt_p <= sqrt_a:
             amount_x = liquidity * (sqrt_b - sqrt_a) / (sqrt_a * sqrt_b)
@@ -129,6 +137,29 @@ class V3Math:
             
         return amount_x, amount_y
 
+    @staticmethod
+    def _amounts_array(liquidity, sqrt_p, sqrt_a, sqrt_b):
+        liquidity, sqrt_p, sqrt_a, sqrt_b = np.broadcast_arrays(*(np.asarray(v, dtype=float) for v in (liquidity, sqrt_p, sqrt_a, sqrt_b)))
+        below = sqrt_p <= sqrt_a
+        above = ~below & (sqrt_p >= sqrt_b)
+
+        # Mismos tres regímenes que el camino escalar, elegidos con np.where
+        with np.errstate(invalid='ignore', divide='ignore'):
+            amount_x = np.where(below, liquidity * (sqrt_b - sqrt_a) / (sqrt_a * sqrt_b),
+                                np.where(above, 0.0, liquidity * (sqrt_b - sqrt_p) / (sqrt_p * sqrt_b)))
+            amount_y = np.where(below, 0.0,
+                                np.where(above, liquidity * (sqrt_b - sqrt_a), liquidity * (sqrt_p - sqrt_a)))
+        return amount_x, amount_y
+
+    @staticmethod
+    def calculate_position_value(liquidity, sqrt_p, sqrt_a, sqrt_b):
+        """
+        Tokens (x, y) y valor de la posición en unidades del Token Quote
+        (x * P + y) al precio sqrt_p. Escalar o arrays, como calculate_amounts.
+        """
+        amount_x, amount_y = V3Math.calculate_amounts(liquidity, sqrt_p, sqrt_a, sqrt_b)
+        return amount_x, amount_y, amount_x * (sqrt_p * sqrt_p) + amount_y
+
     @staticmethod
     def calculate_concentration_multiplier(range_width_pct):
         # Mantenemos esta función por compatibilidad, aunque no se use en el cálculo de IL
@@ -0,0 +1,151 @@
+import hashlib
+
+import numpy as np
+
+COLUMNS = ('date', 'price_native', 'price_usd', 'price', 'apr', 'liquidity')
+
+
+def _to_float(value, default=np.nan):
+    """Convierte a float; None o valores no numéricos -> default."""
+    if value is None: return default
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _to_date(value):
+    """Fecha de la API (YYYYMMDDHHMMSS) como entero; -1 si no es parseable."""
+    try:
+        return int(str(value))
+    except (TypeError, ValueError):
+        return -1
+
+
+def dates_to_datetime64(dates):
+    """
+    Fechas YYYYMMDDHHMMSS (int64) a datetime64[s] en bloque; NaT si no son
+    una fecha válida de 14 dígitos.
+    """
+    d = np.asarray(dates, dtype=np.int64)
+    year, rest = np.divmod(d, 10**10)
+    month, rest = np.divmod(rest, 10**8)
+    day, rest = np.divmod(rest, 10**6)
+    hour, rest = np.divmod(rest, 10**4)
+    minute, second = np.divmod(rest, 100)
+
+    valid = ((year >= 1000) & (year <= 9999) & (month >= 1) & (month <= 12) & (day >= 1) & (day <= 31)
+             & (hour < 24) & (minute < 60) & (second < 60))
+    months = np.where(valid, (year - 1970) * 12 + (month - 1), 0).astype('datetime64[M]')
+    days = months.astype('datetime64[D]') + np.where(valid, day - 1, 0)
+    # Un día fuera del mes (ej. 31 de abril) pasa al mes siguiente: no es válido
+    valid &= days.astype('datetime64[M]') == months
+
+    out = days.astype('datetime64[s]') + (hour * 3600 + minute * 60 + second)
+    out[~valid] = np.datetime64('NaT')
+    return out
+
+
+class PoolHistory:
+    """
+    Historial de un pool en formato columnar (arrays NumPy), en el mismo orden
+    que la API: el snapshot más reciente primero.
+
+    `price` ya tiene resuelto el fallback priceNative -> priceUsd (NaN si
+    ninguno es válido). `apr` es NaN cuando el snapshot no trae apr (o apr=None).
+    """
+    __slots__ = COLUMNS
+
+    def __init__(self, date, price_native, price_usd, apr, liquidity, price=None):
+        self.date = np.asarray(date, dtype=np.int64)
+        self.price_native = np.asarray(price_native, dtype=float)
+        self.price_usd = np.asarray(price_usd, dtype=float)
+        self.apr = np.asarray(apr, dtype=float)
+        self.liquidity = np.asarray(liquidity, dtype=float)
+
+        if price is None:
+            native_ok = np.isfinite(self.price_native) & (self.price_native > 0)
+            usd_ok = np.isfinite(self.price_usd) & (self.price_usd > 0)
+            price = np.where(native_ok, self.price_native, np.where(usd_ok, self.price_usd, np.nan))
+        self.price = np.asarray(price, dtype=float)
+
+    @classmethod
+    def from_records(cls, records):
+        """Construye el historial a partir de la lista de dicts de la API."""
+        records = records or []
+        n = len(records)
+        date = np.empty(n, dtype=np.int64)
+        price_native = np.empty(n)
+        price_usd = np.empty(n)
+        apr = np.empty(n)
+        liquidity = np.empty(n)
+
+        for i, snap in enumerate(records):
+            date[i] = _to_date(snap.get('date'))
+            price_native[i] = _to_float(snap.get('priceNative'))
+            price_usd[i] = _to_float(snap.get('priceUsd'))
+            # Sin clave 'apr' o apr=None: NaN (las métricas lo descartan, el backtest lo trata como 0)
+            apr[i] = _to_float(snap.get('apr'))
+            liquidity[i] = _to_float(snap.get('Liquidity', 0), 0.0)
+
+        return cls(date, price_native, price_usd, apr, liquidity).freeze()
+
+    @classmethod
+    def coerce(cls, history):
+        """Acepta un PoolHistory o la lista de dicts original."""
+        if isinstance(history, cls): return history
+        return cls.from_records(history)
+
+    @classmethod
+    def empty(cls):
+        return cls.from_records([])
+
+    def freeze(self):
+        """Marca los arrays como solo-lectura (el objeto se comparte entre sesiones)."""
+        for name in COLUMNS:
+            getattr(self, name).flags.writeable = False
+        return self
+
+    def __len__(self):
+        return len(self.date)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            # Vistas sobre los mismos arrays, sin copia
+            return PoolHistory(
+                self.date[key], self.price_native[key], self.price_usd[key],
+                self.apr[key], self.liquidity[key], price=self.price[key]
+            )
+        return self.record(key)
+
+    def record(self, i):
+        """Snapshot i como dict (compatibilidad con el formato de la API)."""
+        return {
+            'date': str(self.date[i]) if self.date[i] >= 0 else None,
+            'priceNative': None if np.isnan(self.price_native[i]) else float(self.price_native[i]),
+            'priceUsd': None if np.isnan(self.price_usd[i]) else float(self.price_usd[i]),
+            'apr': None if np.isnan(self.apr[i]) else float(self.apr[i]),
+            'Liquidity': float(self.liquidity[i]),
+        }
+
+    def to_records(self):
+        return [self.record(i) for i in range(len(self))]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.record(i)
+
+    def fingerprint(self):
+        """Huella del contenido para claves de caché: último snapshot, tamaño y hash de las columnas."""
+        digest = hashlib.sha1()
+        for name in COLUMNS:
+            digest.update(np.ascontiguousarray(getattr(self, name)).tobytes())
+        latest = int(self.date[0]) if len(self) else -1
+        return f"{latest}:{len(self)}:{digest.hexdigest()}"
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in COLUMNS)
+
+    def __repr__(self):
+        return f"PoolHistory(n={len(self)})"
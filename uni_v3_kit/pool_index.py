@@ -0,0 +1,88 @@
+import bisect
+import numpy as np
+
+
+def _tvl(pool):
+    try: return float(pool.get('Liquidity', 0))
+    except: return 0.0
+
+
+class PoolIndex:
+    """
+    Índice sobre el listado de pools para el filtro del escáner.
+
+    - símbolo normalizado (mayúsculas) -> posiciones de los pools que lo tienen
+      como BaseToken o QuoteToken
+    - lista ordenada de sufijos de símbolos: la búsqueda por subcadena
+      (`asset in base`) se resuelve como búsqueda por prefijo con bisect
+    - por red, posiciones ordenadas por TVL: el TVL mínimo es un bisect
+
+    Las consultas devuelven posiciones en el orden original del listado.
+    """
+
+    def __init__(self, pools):
+        self.pools = pools
+        self._contains_cache = {}
+
+        tokens = {}
+        for i, p in enumerate(pools):
+            # Mismo criterio que el filtro lineal: str(None) -> 'NONE'
+            base = str(p.get('BaseToken', '')).upper()
+            quote = str(p.get('QuoteToken', '')).upper()
+            tokens.setdefault(base, []).append(i)
+            if quote != base:
+                tokens.setdefault(quote, []).append(i)
+        self.by_token = {s: np.array(v, dtype=np.int64) for s, v in tokens.items()}
+
+        self._suffixes = sorted({(s[k:], s) for s in self.by_token for k in range(len(s))})
+        self._suffix_keys = [x[0] for x in self._suffixes]
+
+        tvl = np.array([_tvl(p) for p in pools], dtype=float)
+        self.tvl = tvl
+        self._all = self._sorted_by_tvl(np.arange(len(pools), dtype=np.int64))
+        chains = {}
+        for i, p in enumerate(pools):
+            chains.setdefault(p.get('ChainId'), []).append(i)
+        self.by_chain = {c: self._sorted_by_tvl(np.array(v, dtype=np.int64)) for c, v in chains.items()}
+
+    def _sorted_by_tvl(self, positions):
+        order = np.argsort(self.tvl[positions], kind='stable')
+        return positions[order], self.tvl[positions][order]
+
+    def symbols_containing(self, asset):
+        """Símbolos que contienen `asset` como subcadena (memoizado)."""
+        asset = asset.upper()
+        if asset not in self._contains_cache:
+            found = set()
+            k = bisect.bisect_left(self._suffix_keys, asset)
+            while k < len(self._suffix_keys) and self._suffix_keys[k].startswith(asset):
+                found.add(self._suffixes[k][1])
+                k += 1
+            self._contains_cache[asset] = found
+        return self._contains_cache[asset]
+
+    def positions_for_assets(self, assets):
+        symbols = set()
+        for asset in assets:
+            symbols |= self.symbols_containing(asset)
+        if not symbols: return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate([self.by_token[s] for s in symbols]))
+
+    def positions_for_chains(self, target_chains, min_tvl):
+        groups = [self.by_chain[c] for c in target_chains if c in self.by_chain] if target_chains else [self._all]
+        parts = []
+        for positions, tvl_sorted in groups:
+            start = np.searchsorted(tvl_sorted, min_tvl, side='left')
+            parts.append(positions[start:])
+        if not parts: return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(parts))
+
+    def query(self, target_chains, min_tvl, assets):
+        """Posiciones (orden del listado) que pasan los filtros de red, TVL y activos."""
+        result = self.positions_for_chains(target_chains, min_tvl)
+        if assets:
+            result = np.intersect1d(result, self.positions_for_assets(assets), assume_unique=True)
+        return result
+
+    def select(self, target_chains, min_tvl, assets):
+        return [self.pools[i] for i in self.query(target_chains, min_tvl, assets)]
@@ -0,0 +1,106 @@
+import codecs
+import json
+
+_decoder = json.JSONDecoder()
+_WS = ' \t\n\r'
+
+# Campos del listado que usan el escáner y la tabla de resultados
+POOL_FIELDS = ('pairAddress', '_id', 'poolName', 'ChainId', 'DexId', 'BaseToken', 'QuoteToken',
+               'feeTier', 'Liquidity', 'Volume')
+
+
+class _Buffer:
+    """Texto decodificado de forma incremental a partir de trozos de bytes."""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.utf8 = codecs.getincrementaldecoder('utf-8')()
+        self.text = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """Lee un trozo más. Devuelve False si ya no quedan datos."""
+        if self.eof: return False
+        # Descartamos lo ya consumido para que el buffer no crezca
+        if self.pos > 65536:
+            self.text = self.text[self.pos:]
+            self.pos = 0
+        for chunk in self.chunks:
+            if chunk:
+                self.text += self.utf8.decode(chunk)
+                return True
+        self.text += self.utf8.decode(b'', final=True)
+        self.eof = True
+        return False
+
+    def peek(self):
+        """Siguiente carácter no blanco (sin consumirlo) o '' al final."""
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in _WS:
+                self.pos += 1
+            if self.pos < len(self.text): return self.text[self.pos]
+            if not self.fill(): return ''
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"JSON inesperado: se esperaba '{char}' en posición {self.pos}")
+        self.pos += 1
+
+    def value(self):
+        """Decodifica el siguiente valor JSON completo, leyendo más si está cortado."""
+        self.peek()
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(self.text, self.pos)
+                # Un número al final del buffer puede continuar en el siguiente trozo
+                if end < len(self.text) or self.eof:
+                    self.pos = end
+                    return obj
+            except json.JSONDecodeError:
+                if self.eof: raise
+            self.fill()
+
+
+def iter_json_array(chunks, key='pools'):
+    """
+    Genera uno a uno los elementos del array `key` de un objeto JSON de nivel
+    superior, sin cargar el documento completo en memoria.
+    """
+    buf = _Buffer(chunks)
+    buf.expect('{')
+    while True:
+        char = buf.peek()
+        if char == '}' or char == '': return
+        if char == ',':
+            buf.pos += 1
+            continue
+
+        name = buf.value()
+        buf.expect(':')
+        if name != key or buf.peek() != '[':
+            buf.value()
+            continue
+
+        buf.pos += 1
+        while True:
+            char = buf.peek()
+            if char == ']': return
+            if char == '': raise ValueError("JSON truncado dentro del listado")
+            if char == ',':
+                buf.pos += 1
+                continue
+            yield buf.value()
+
+
+def _as_float(value):
+    try: return float(value)
+    except (TypeError, ValueError): return 0.0
+
+
+def normalize_pool(pool):
+    """Registro compacto del listado: solo los campos usados y números ya convertidos."""
+    record = {k: pool[k] for k in POOL_FIELDS if k in pool}
+    record['Liquidity'] = _as_float(pool.get('Liquidity', 0))
+    record['Volume'] = _as_float(pool.get('Volume', 0))
+    return record
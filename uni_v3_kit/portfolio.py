@@ -0,0 +1,171 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from .backtester import Backtester
+from .batch_metrics import batch_realized_volatility
+from .math_core import V3Math
+from .pool_history import PoolHistory, dates_to_datetime64
+from .rolling_vol import RollingVolatility
+
+SLOT_SECONDS = 8 * 3600  # Un snapshot cada 8h (3 por día)
+
+
+def align_histories(histories, n_slots):
+    """
+    Alinea varios historiales sobre la rejilla de 8h: los últimos `n_slots` huecos
+    hasta el último snapshot común a todos. Devuelve (slots, raw, filled), donde
+    raw/filled son dicts de matrices (pools x n_slots) por columna; `raw` tiene NaN
+    donde falta snapshot y `filled` arrastra el último snapshot conocido.
+    """
+    slot_ids = []
+    for h in histories:
+        ts = dates_to_datetime64(h.date).astype('datetime64[s]').astype(np.int64)
+        ok = h.date >= 0
+        slot_ids.append(np.where(ok, ts // SLOT_SECONDS, -1))
+
+    latest = [s[s >= 0].max() for s in slot_ids if (s >= 0).any()]
+    end = min(latest) if latest else 0
+    slots = np.arange(end - n_slots + 1, end + 1)
+
+    raw = {name: np.full((len(histories), n_slots), np.nan) for name in ('price', 'price_usd', 'apr')}
+    for i, (h, s) in enumerate(zip(histories, slot_ids)):
+        col = s - slots[0]
+        # Orden cronológico: con dos snapshots en el mismo hueco gana el más reciente
+        keep = ((s >= 0) & (col >= 0) & (col < n_slots))[::-1]
+        col = col[::-1][keep]
+        raw['price'][i, col] = h.price[::-1][keep]
+        raw['price_usd'][i, col] = h.price_usd[::-1][keep]
+        raw['apr'][i, col] = h.apr[::-1][keep]
+
+    for name in ('price', 'price_usd'):
+        raw[name][~(raw[name] > 0)] = np.nan
+    filled = {name: _ffill(values) for name, values in raw.items()}
+    return slots, raw, filled
+
+
+def _ffill(values):
+    """Rellena cada fila hacia delante con el último valor no-NaN."""
+    idx = np.where(~np.isnan(values), np.arange(values.shape[1]), 0)
+    np.maximum.accumulate(idx, axis=1, out=idx)
+    return np.take_along_axis(values, idx, axis=1)
+
+
+def run_portfolio(histories, allocation, sd_multiplier=1.0, sim_days=30, vol_days=7, auto_rebalance=False, names=None):
+    """
+    Backtest de una cartera de posiciones V3 (una por pool) sobre la rejilla común de 8h.
+
+    `histories` y `allocation` son listas paralelas (historial y USD invertidos por pool)
+    o dicts por nombre. Las posiciones sin rebalanceo se simulan todas a la vez como
+    matrices (pools x periodos); con rebalanceo cada pool usa el motor por eventos del
+    Backtester. Los huecos del historial arrastran el último snapshot; un pool sin
+    precio al inicio de la simulación se queda en liquidez (Estado 'Sin datos').
+
+    Devuelve (equity, aggregate, summary):
+    - equity: Valor Total por pool (una columna por pool, índice Date)
+    - aggregate: Valor Total, HODL Value y Fees Acum de toda la cartera
+    - summary: una fila por pool con el resultado final
+    """
+    if isinstance(histories, dict):
+        names = list(histories)
+        histories = [histories[n] for n in names]
+        allocation = [allocation[n] for n in names] if isinstance(allocation, dict) else allocation
+    histories = [PoolHistory.coerce(h) for h in histories]
+    names = list(names) if names is not None else [f"Pool {i + 1}" for i in range(len(histories))]
+    capital = np.asarray(allocation, dtype=float)
+    if not len(histories): return None
+
+    warmup = vol_days * 3
+    n_slots = (sim_days + vol_days) * 3
+    slots, raw, filled = align_histories(histories, n_slots)
+    n_pools = len(histories)
+
+    # --- 1. Rango inicial de todos los pools a la vez ---
+    vol = batch_realized_volatility(raw['price'][:, :warmup])
+    width = np.clip(vol * math.sqrt(vol_days / 365.0) * sd_multiplier, 0.01, 1.0)
+
+    p_native = filled['price'][:, warmup:]
+    p_base_usd = filled['price_usd'][:, warmup:]
+    apr = np.nan_to_num(filled['apr'][:, warmup:])
+    active = ~np.isnan(p_native[:, 0]) & ~np.isnan(p_base_usd[:, 0])
+
+    p0 = np.where(active, p_native[:, 0], 1.0)
+    b0 = np.where(active, p_base_usd[:, 0], 1.0)
+    lower, upper = p0 * (1 - width), p0 * (1 + width)
+
+    # --- 2. Liquidez (el precio de entrada está en el centro del rango) ---
+    sqrt_p, sqrt_a, sqrt_b = np.sqrt(p0), np.sqrt(lower), np.sqrt(upper)
+    x_unit = (sqrt_b - sqrt_p) / (sqrt_p * sqrt_b)
+    y_unit = sqrt_p - sqrt_a
+    liquidity = capital / ((x_unit * b0) + (y_unit * (b0 / p0)))
+    hodl_x, hodl_y = x_unit * liquidity, y_unit * liquidity
+
+    # --- 3. Simulación en bloque (rango fijo) ---
+    with np.errstate(invalid='ignore', divide='ignore'):
+        p_quote_usd = p_base_usd / p_native
+        curr_x, curr_y = V3Math.calculate_amounts(liquidity[:, None], np.sqrt(p_native), sqrt_a[:, None], sqrt_b[:, None])
+        val_pos = (curr_x * p_base_usd) + (curr_y * p_quote_usd)
+        in_range = (lower[:, None] <= p_native) & (p_native <= upper[:, None])
+        fees = np.where(in_range & (apr != 0), val_pos * ((apr / 100.0) / 1095.0), 0.0)
+        fees_acum = np.cumsum(fees, axis=1)
+        hodl = (hodl_x[:, None] * p_base_usd) + (hodl_y[:, None] * p_quote_usd)
+    total = val_pos + fees_acum
+    rebalances = np.zeros(n_pools, dtype=int)
+
+    # --- 4. Pools con rebalanceo: motor por eventos sobre la rejilla alineada ---
+    if auto_rebalance:
+        tester = Backtester(cache=False)
+        for i in np.flatnonzero(active):
+            aligned = PoolHistory(np.full(n_slots, -1), filled['price'][i], filled['price_usd'][i],
+                                  filled['apr'][i], np.zeros(n_slots), price=filled['price'][i])
+            df, rebalances[i], _ = tester._simulate_rebalancing(
+                aligned, warmup, liquidity[i], hodl_x[i], hodl_y[i], lower[i], upper[i], width[i],
+                RollingVolatility(raw['price'][i]), vol_days, sd_multiplier, "realized"
+            )
+            total[i] = df['Valor Total'].to_numpy()
+            fees_acum[i] = df['Fees Acum'].to_numpy()
+            hodl[i] = df['HODL Value'].to_numpy()
+
+    # Pools sin precio al inicio: el capital queda sin invertir
+    total[~active] = capital[~active, None]
+    hodl[~active] = capital[~active, None]
+    fees_acum[~active] = 0.0
+
+    dates = pd.to_datetime(slots[warmup:] * SLOT_SECONDS, unit='s')
+    equity = pd.DataFrame(total.T, index=pd.Index(dates, name='Date'), columns=names)
+    aggregate = pd.DataFrame({
+        "Date": dates,
+        "Valor Total": total.sum(axis=0),
+        "HODL Value": hodl.sum(axis=0),
+        "Fees Acum": fees_acum.sum(axis=0),
+    })
+    summary = pd.DataFrame({
+        "Pool": names,
+        "Inversión": capital,
+        "Valor Final": total[:, -1],
+        "Fees Totales": fees_acum[:, -1],
+        "HODL Value": hodl[:, -1],
+        "Rebalanceos": rebalances,
+        "Rango Inicial %": np.where(active, width * 100, np.nan),
+        "Estado": np.where(active, "OK", "Sin datos"),
+    })
+    return equity, aggregate, summary
+
+
+def backtest_scan(scan_results, total_capital, scanner, **kwargs):
+    """
+    Cartera equiponderada con los pools de MarketScanner.scan: descarga los
+    historiales en paralelo (scanner.fetch_histories) y llama a run_portfolio.
+    """
+    addresses = [a for a in scan_results['Address'].tolist() if a]
+    details = dict(scanner.fetch_histories(addresses))
+    names, histories = [], []
+    for (address, par) in zip(scan_results['Address'], scan_results['Par']):
+        history = details.get(address, {}).get('history')
+        if history is None or not len(history): continue
+        names.append(f"{par} ({address[:6]}…{address[-4:]})")
+        histories.append(history)
+    if not histories: return None
+    allocation = [total_capital / len(histories)] * len(histories)
+    return run_portfolio(histories, allocation, names=names, **kwargs)
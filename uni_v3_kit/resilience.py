@@ -0,0 +1,236 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urlparse
+
+import numpy as np
+import requests
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """El endpoint tiene el circuito abierto: se responde con datos en caché."""
+
+
+class BudgetExceededError(requests.Timeout):
+    """La petición (con su hedge) no terminó dentro del presupuesto total del endpoint."""
+
+
+def _discard(future):
+    """Cierra la respuesta de un intento abandonado cuando por fin termine."""
+    def close(f):
+        if f.exception() is None:
+            f.result()[0].close()
+    future.add_done_callback(close)
+
+
+class CircuitBreaker:
+    """
+    closed -> open tras `failure_threshold` fallos seguidos; pasado `reset_timeout`
+    deja pasar una petición de prueba (half_open) que lo cierra o lo reabre.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.short_circuited = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed": return True
+            if self.state == "open" and time.time() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.short_circuited += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.time()
+
+
+class EndpointPolicy:
+    """Presupuesto de latencia y parámetros de hedging de un endpoint."""
+
+    def __init__(self, budget=10.0, hedge=True, hedge_quantile=95, min_hedge_delay=0.05, min_samples=20,
+                 connect_timeout=3.05):
+        self.budget = budget
+        self.connect_timeout = connect_timeout
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.min_hedge_delay = min_hedge_delay
+        self.min_samples = min_samples
+
+
+DEFAULT_POLICIES = {
+    "pools": EndpointPolicy(budget=20.0),
+    "history": EndpointPolicy(budget=10.0),
+    "deribit": EndpointPolicy(budget=5.0),
+    "default": EndpointPolicy(budget=10.0, hedge=False),
+}
+
+
+def endpoint_name(url):
+    """Clasifica una URL en uno de los endpoints con política propia."""
+    parsed = urlparse(url)
+    if "deribit" in parsed.netloc: return "deribit"
+    path = parsed.path.rstrip("/")
+    if path.endswith("/history"): return "history"
+    if path.endswith("/pools"): return "pools"
+    return "default"
+
+
+class _EndpointState:
+    def __init__(self, policy):
+        self.policy = policy
+        self.breaker = CircuitBreaker()
+        self.latencies = deque(maxlen=200)
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def hedge_delay(self):
+        if len(self.latencies) < self.policy.min_samples: return None
+        p = float(np.percentile(self.latencies, self.policy.hedge_quantile))
+        return max(self.policy.min_hedge_delay, p)
+
+
+class ResilientTransport:
+    """
+    Envoltorio de transporte con protección de latencia de cola por endpoint:
+    presupuesto del endpoint como plazo total de la petición (BudgetExceededError),
+    petición de cobertura (hedge) si la primera supera el p95 observado, y circuit
+    breaker que corta en seco (CircuitOpenError) cuando el endpoint falla de forma
+    continuada.
+    """
+
+    def __init__(self, inner, policies=None, max_workers=64):
+        self.inner = inner
+        self.policies = dict(DEFAULT_POLICIES, **(policies or {}))
+        self._endpoints = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="uni-v3-http")
+
+    def _state(self, name):
+        with self._lock:
+            if name not in self._endpoints:
+                policy = self.policies.get(name, self.policies["default"])
+                self._endpoints[name] = _EndpointState(policy)
+            return self._endpoints[name]
+
+    def _call(self, url, params, headers, timeout, stream):
+        t0 = time.perf_counter()
+        response = self.inner.get(url, params=params, headers=headers, timeout=timeout, stream=stream)
+        return response, time.perf_counter() - t0
+
+    def get(self, url, params=None, headers=None, timeout=None, stream=False):
+        state = self._state(endpoint_name(url))
+        if not state.breaker.allow():
+            raise CircuitOpenError(f"Circuito abierto para {url}")
+
+        timeout = timeout or (state.policy.connect_timeout, state.policy.budget)
+        # El timeout de lectura de requests es por lectura de socket (una respuesta que
+        # gotea lo reinicia): el presupuesto se aplica además como plazo total
+        budget = timeout[1] if isinstance(timeout, tuple) else timeout
+        deadline = time.monotonic() + budget
+        try:
+            response, elapsed = self._get_hedged(state, url, params, headers, timeout, stream, deadline)
+        except Exception:
+            state.breaker.record_failure()
+            raise
+
+        if response.status_code >= 500:
+            state.breaker.record_failure()
+        else:
+            state.breaker.record_success()
+            state.latencies.append(elapsed)
+        return response
+
+    def _get_hedged(self, state, url, params, headers, timeout, stream, deadline):
+        """
+        Primer intento y, si va más lento que el p95, un hedge; gana el primero que
+        responda. Todo dentro del plazo `deadline` (con stream=True, hasta las cabeceras).
+        """
+        primary = self._executor.submit(self._call, url, params, headers, timeout, stream)
+        pending = {primary}
+        hedge = None
+
+        delay = state.hedge_delay() if (state.policy.hedge and not stream) else None
+        if delay is not None:
+            done, _ = wait(pending, timeout=min(delay, max(0.0, deadline - time.monotonic())))
+            if not done and time.monotonic() < deadline:
+                # La primera petición va lenta: lanzamos una segunda y nos quedamos con la que acabe antes
+                hedge = self._executor.submit(self._call, url, params, headers, timeout, stream)
+                pending.add(hedge)
+                with self._lock:
+                    state.hedges += 1
+
+        error = None
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                for future in pending:
+                    _discard(future)
+                raise BudgetExceededError(f"Presupuesto de {url} agotado")
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        with self._lock:
+                            state.hedge_wins += 1
+                    for other in pending:
+                        _discard(other)
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def get_json(self, url, params=None, headers=None, timeout=None):
+        response = self.get(url, params=params, headers=headers, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def endpoint_stats(self):
+        """Estado del breaker, hedges y latencias por endpoint (para ajustar políticas)."""
+        with self._lock:
+            items = list(self._endpoints.items())
+        out = {}
+        for name, st in items:
+            lat = np.array(st.latencies, dtype=float) * 1000.0
+            out[name] = {
+                "breaker_state": st.breaker.state,
+                "consecutive_failures": st.breaker.failures,
+                "short_circuited": st.breaker.short_circuited,
+                "hedges": st.hedges,
+                "hedge_wins": st.hedge_wins,
+                "budget_s": st.policy.budget,
+                "p95_ms": float(np.percentile(lat, 95)) if lat.size else 0.0,
+            }
+        return out
+
+    def stats(self):
+        stats = self.inner.stats()
+        stats["endpoints"] = self.endpoint_stats()
+        return stats
+
+    def reset_stats(self):
+        self.inner.reset_stats()
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.inner.close()
@@ -0,0 +1,183 @@
+import copy
+import hashlib
+import os
+import pickle
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from .history_store import DEFAULT_DIR
+
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def make_key(namespace, *parts):
+    """Clave de contenido: hash de la representación de los argumentos."""
+    digest = hashlib.sha1(repr((namespace,) + parts).encode()).hexdigest()
+    return f"{namespace}:{digest}"
+
+
+def _sizeof(value):
+    """Tamaño aproximado de un resultado (DataFrames, tuplas y dicts anidados)."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, (tuple, list)):
+        return sum(_sizeof(v) for v in value) + sys.getsizeof(value)
+    if isinstance(value, dict):
+        return sum(_sizeof(v) for v in value.values()) + sys.getsizeof(value)
+    return sys.getsizeof(value)
+
+
+def _copy(value):
+    """Copia para que quien recibe el resultado pueda modificarlo (la página añade columnas al df)."""
+    if isinstance(value, pd.DataFrame):
+        return value.copy()
+    if isinstance(value, tuple):
+        return tuple(_copy(v) for v in value)
+    return copy.copy(value)
+
+
+class ResultCache:
+    """
+    Caché LRU de resultados (backtests, escaneos) con memoria acotada por
+    número de entradas y bytes aproximados, y un nivel opcional en disco
+    (un pickle por clave) que sobrevive a reinicios del proceso.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES, disk_dir=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+        self._entries = OrderedDict()  # key -> (value, size, stored_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key.replace(":", "_") + ".pkl")
+
+    def get(self, key, max_age=None):
+        """Resultado guardado (copia) o None. `max_age` en segundos descarta entradas antiguas."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (max_age is None or now - entry[2] < max_age):
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return _copy(entry[0])
+
+        if self.disk_dir:
+            try:
+                with open(self._disk_path(key), "rb") as f:
+                    stored_at, value = pickle.load(f)
+                if max_age is None or now - stored_at < max_age:
+                    self._store(key, value, stored_at)
+                    with self._lock:
+                        self._disk_hits += 1
+                    return _copy(value)
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                print(f"Error leyendo caché de resultados: {e}")
+
+        with self._lock:
+            self._misses += 1
+        return None
+
+    def put(self, key, value):
+        stored_at = time.time()
+        value = _copy(value)
+        self._store(key, value, stored_at)
+        if self.disk_dir:
+            try:
+                path = self._disk_path(key)
+                tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp, "wb") as f:
+                    pickle.dump((stored_at, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, path)
+            except Exception as e:
+                print(f"Error guardando caché de resultados: {e}")
+
+    def _store(self, key, value, stored_at):
+        size = _sizeof(value)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, size, stored_at)
+            self._bytes += size
+            # Expulsión LRU hasta volver dentro de los límites (la entrada nueva se queda)
+            while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, old_size, _) = self._entries.popitem(last=False)
+                self._bytes -= old_size
+                self._evictions += 1
+
+    def get_or_compute(self, key, fn, *args, max_age=None, **kwargs):
+        """Devuelve el resultado guardado o calcula fn(*args, **kwargs) y lo guarda (salvo None)."""
+        value = self.get(key, max_age=max_age)
+        if value is not None: return value
+        value = fn(*args, **kwargs)
+        if value is not None:
+            self.put(key, value)
+        return value
+
+    def clear(self, disk=False):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if disk and self.disk_dir:
+            for name in os.listdir(self.disk_dir):
+                if name.endswith(".pkl"):
+                    os.remove(os.path.join(self.disk_dir, name))
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._disk_hits + self._misses
+            return {
+                "hits": self._hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "hit_rate": (self._hits + self._disk_hits) / lookups if lookups else 0.0,
+                "evictions": self._evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+def get_result_cache():
+    """
+    Caché de resultados del proceso. Se desactiva con UNI_V3_RESULT_CACHE=0;
+    UNI_V3_RESULT_CACHE_DISK=1 añade el nivel en disco ($UNI_V3_CACHE_DIR/results)
+    y UNI_V3_RESULT_CACHE_ENTRIES / _MB ajustan los límites de memoria.
+    """
+    global _shared_cache
+    if os.environ.get("UNI_V3_RESULT_CACHE", "1") == "0":
+        return None
+    with _shared_lock:
+        if _shared_cache is None:
+            disk_dir = None
+            if os.environ.get("UNI_V3_RESULT_CACHE_DISK") == "1":
+                disk_dir = os.path.join(os.environ.get("UNI_V3_CACHE_DIR", DEFAULT_DIR), "results")
+            try:
+                _shared_cache = ResultCache(
+                    max_entries=int(os.environ.get("UNI_V3_RESULT_CACHE_ENTRIES", DEFAULT_MAX_ENTRIES)),
+                    max_bytes=float(os.environ.get("UNI_V3_RESULT_CACHE_MB", DEFAULT_MAX_BYTES / 2**20)) * 2**20,
+                    disk_dir=disk_dir,
+                )
+            except Exception as e:
+                print(f"Error creando caché de resultados: {e}")
+                return None
+        return _shared_cache
@@ -0,0 +1,123 @@
+import math
+import numpy as np
+
+# Mismo valor por defecto y anualización que V3Math.calculate_realized_volatility
+DEFAULT_VOL = 0.80
+MIN_WINDOW = 5
+
+ESTIMATORS = ("realized", "ewma", "parkinson")
+# Estimadores que solo necesitan precios (los que admite el Backtester)
+PRICE_ESTIMATORS = ("realized", "ewma")
+
+
+class RollingVolatility:
+    """
+    Volatilidad anualizada de cualquier ventana [start, stop) de una serie de
+    precios. Los log-retornos se calculan una vez por historial y:
+    - las consultas sueltas (realized / ewma / parkinson) se evalúan sobre el
+      tramo de la ventana, O(ventana) y exactas (el Backtester necesita las
+      mismas filas que el cálculo original)
+    - realized_many resuelve muchas ventanas a la vez en O(1) por ventana con
+      sumas acumuladas (centradas en la media global; difiere de `realized` en
+      redondeo, ~1e-11 relativo), para barridos en bloque
+
+    - realized: desviación típica de los log-retornos entre precios válidos
+      consecutivos (mismo resultado que calculate_realized_volatility sobre la ventana)
+    - ewma: varianza con pesos exponenciales (RiskMetrics) de los retornos de la ventana
+    - parkinson: rango alto/bajo de cada periodo; necesita highs y lows
+      (los historiales de pools solo traen un precio por snapshot)
+    """
+
+    def __init__(self, prices, highs=None, lows=None, periods_per_year=365, ewma_lambda=0.94):
+        prices = np.asarray(prices, dtype=float)
+        self.n = len(prices)
+        self.annualization = math.sqrt(periods_per_year)
+        self.ewma_lambda = ewma_lambda
+
+        # --- Retornos entre precios válidos (NaN / <= 0 se saltan) ---
+        valid = prices > 0
+        self._valid_before = np.concatenate(([0], np.cumsum(valid)))
+        self._returns = np.diff(np.log(prices[valid]))
+        self._sums = None
+
+        # --- Parkinson: ln(H/L)^2 por periodo (NaN si el periodo no es válido) ---
+        self._range_sq = None
+        if highs is not None and lows is not None:
+            highs = np.asarray(highs, dtype=float)
+            lows = np.asarray(lows, dtype=float)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                range_sq = np.log(highs / lows) ** 2
+            ok = (highs > 0) & (lows > 0) & (highs >= lows)
+            self._range_sq = np.where(ok, range_sq, np.nan)
+
+    @classmethod
+    def from_history(cls, history, **kwargs):
+        """Desde un PoolHistory (columna `price`, con el fallback a priceUsd)."""
+        return cls(history.price, **kwargs)
+
+    def _window_returns(self, start, stop):
+        """Retornos de la ventana de muestras [start, stop)."""
+        a = self._valid_before[start]
+        b = self._valid_before[stop] - 1
+        return self._returns[a:max(a, b)]
+
+    def realized(self, start, stop):
+        start, stop = max(0, start), min(self.n, stop)
+        if stop - start < MIN_WINDOW: return DEFAULT_VOL
+        returns = self._window_returns(start, stop)
+        if not len(returns): return DEFAULT_VOL
+        return np.std(returns) * self.annualization
+
+    def ewma(self, start, stop):
+        start, stop = max(0, start), min(self.n, stop)
+        if stop - start < MIN_WINDOW: return DEFAULT_VOL
+        returns = self._window_returns(start, stop)
+        if not len(returns): return DEFAULT_VOL
+
+        # Peso lambda^edad: el retorno más reciente pesa 1
+        weights = self.ewma_lambda ** np.arange(len(returns) - 1, -1, -1, dtype=float)
+        var = np.dot(weights, returns * returns) / weights.sum()
+        return math.sqrt(var) * self.annualization
+
+    def parkinson(self, start, stop):
+        if self._range_sq is None:
+            raise ValueError("El estimador parkinson necesita highs y lows (rango alto/bajo por periodo)")
+        start, stop = max(0, start), min(self.n, stop)
+        if stop - start < MIN_WINDOW: return DEFAULT_VOL
+        range_sq = self._range_sq[start:stop]
+        range_sq = range_sq[~np.isnan(range_sq)]
+        if not len(range_sq): return DEFAULT_VOL
+
+        var = range_sq.mean() / (4 * math.log(2))
+        return math.sqrt(var) * self.annualization
+
+    def annualized(self, start, stop, estimator="realized"):
+        """Volatilidad anualizada de la ventana con el estimador indicado."""
+        if estimator not in ESTIMATORS:
+            raise ValueError(f"Estimador desconocido: {estimator}")
+        return getattr(self, estimator)(start, stop)
+
+    def _prefix_sums(self):
+        """Sumas acumuladas de los retornos y sus cuadrados (solo si se usa realized_many)."""
+        if self._sums is None:
+            returns = self._returns
+            # Centradas en la media global para no perder precisión al restar
+            centered = returns - (returns.mean() if len(returns) else 0.0)
+            self._sums = (np.concatenate(([0.0], np.cumsum(centered))),
+                          np.concatenate(([0.0], np.cumsum(centered * centered))))
+        return self._sums
+
+    def realized_many(self, starts, stops):
+        """`realized` para arrays de ventanas, vectorizado con sumas acumuladas."""
+        sums, sums_sq = self._prefix_sums()
+        starts = np.maximum(np.asarray(starts, dtype=np.int64), 0)
+        stops = np.minimum(np.asarray(stops, dtype=np.int64), self.n)
+        a = self._valid_before[starts]
+        b = np.maximum(a, self._valid_before[np.maximum(stops, starts)] - 1)
+        k = b - a
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = (sums[b] - sums[a]) / k
+            var = (sums_sq[b] - sums_sq[a]) / k - mean * mean
+            vol = np.sqrt(np.maximum(var, 0.0)) * self.annualization
+        return np.where(((stops - starts) < MIN_WINDOW) | (k < 1), DEFAULT_VOL, vol)
@@ -0,0 +1,274 @@
+import math
+import time
+
+import numpy as np
+
+# --- Constantes de los contratos (TickMath.sol) ---
+MIN_TICK = -887272
+MAX_TICK = 887272
+MIN_SQRT_RATIO = 4295128739
+MAX_SQRT_RATIO = 1461446703485210103287273052203988822378723970342
+Q96 = 1 << 96
+Q128 = 1 << 128
+MAX_UINT256 = (1 << 256) - 1
+
+# Tick spacing de cada fee tier (en centésimas de bip, como `feeTier` del listado)
+FEE_TIER_SPACING = {100: 1, 500: 10, 3000: 60, 10000: 200}
+
+# ratio * 2^128 = 1 / sqrt(1.0001)^(2^k) para cada bit k del tick
+_TICK_FACTORS = (
+    (0x2, 0xfff97272373d413259a46990580e213a),
+    (0x4, 0xfff2e50f5f656932ef12357cf3c7fdcc),
+    (0x8, 0xffe5caca7e10e4e61c3624eaa0941cd0),
+    (0x10, 0xffcb9843d60f6159c9db58835c926644),
+    (0x20, 0xff973b41fa98c081472e6896dfb254c0),
+    (0x40, 0xff2ea16466c96a3843ec78b326b52861),
+    (0x80, 0xfe5dee046a99a2a811c461f1969c3053),
+    (0x100, 0xfcbe86c7900a88aedcffc83b479aa3a4),
+    (0x200, 0xf987a7253ac413176f2b074cf7815e54),
+    (0x400, 0xf3392b0822b70005940c7a398e4b70f3),
+    (0x800, 0xe7159475a2c29b7443b29c7fa6e889d9),
+    (0x1000, 0xd097f3bdfd2022b8845ad8f792aa5825),
+    (0x2000, 0xa9f746462d870fdf8a65dc1f90e061e5),
+    (0x4000, 0x70d869a156d2a1b890bb3df62baf32f7),
+    (0x8000, 0x31be135f97d08fd981231505542fcfa6),
+    (0x10000, 0x9aa508b5b7a84e1c677de54f3e99bc9),
+    (0x20000, 0x5d6af8dedb81196699c329225ee604),
+    (0x40000, 0x2216e584f5fa1ea926041bedfe98),
+    (0x80000, 0x48a170391f7dc42444e8fa2),
+)
+
+# log1p evita el error de representar 1.0001 en float (~1e-12 relativo en el exponente)
+_LOG_SQRT_10001 = math.log1p(1e-4) / 2
+
+
+# --- Camino exacto (enteros, idéntico a los contratos) ---
+def get_sqrt_ratio_at_tick(tick):
+    """sqrtPriceX96 del tick, como TickMath.getSqrtRatioAtTick."""
+    tick = int(tick)
+    abs_tick = abs(tick)
+    if abs_tick > MAX_TICK: raise ValueError(f"Tick fuera de rango: {tick}")
+
+    ratio = 0xfffcb933bd6fad37aa2d162d1a594001 if abs_tick & 0x1 else Q128
+    for bit, factor in _TICK_FACTORS:
+        if abs_tick & bit:
+            ratio = (ratio * factor) >> 128
+    if tick > 0:
+        ratio = MAX_UINT256 // ratio
+
+    # Q128.128 -> Q64.96 redondeando hacia arriba
+    return (ratio >> 32) + (0 if ratio % (1 << 32) == 0 else 1)
+
+
+def get_tick_at_sqrt_ratio(sqrt_price_x96):
+    """
+    Mayor tick cuyo sqrtPriceX96 es <= sqrt_price_x96 (TickMath.getTickAtSqrtRatio).
+    Se estima con log y se corrige con el camino exacto, así que el resultado es exacto.
+    """
+    sqrt_price_x96 = int(sqrt_price_x96)
+    if not MIN_SQRT_RATIO <= sqrt_price_x96 < MAX_SQRT_RATIO:
+        raise ValueError(f"sqrtPriceX96 fuera de rango: {sqrt_price_x96}")
+
+    tick = math.floor((math.log(sqrt_price_x96) - math.log(Q96)) / _LOG_SQRT_10001)
+    tick = min(max(tick, MIN_TICK), MAX_TICK)
+    while tick > MIN_TICK and get_sqrt_ratio_at_tick(tick) > sqrt_price_x96:
+        tick -= 1
+    while tick < MAX_TICK and get_sqrt_ratio_at_tick(tick + 1) <= sqrt_price_x96:
+        tick += 1
+    return tick
+
+
+def tick_spacing_for_fee(fee_tier):
+    """Tick spacing de un fee tier (100, 500, 3000, 10000)."""
+    try:
+        return FEE_TIER_SPACING[int(fee_tier)]
+    except (KeyError, TypeError, ValueError):
+        raise ValueError(f"Fee tier desconocido: {fee_tier}")
+
+
+def snap_tick(tick, tick_spacing, mode="nearest"):
+    """
+    Ajusta un tick a un múltiplo del tick spacing ('down', 'up' o 'nearest'),
+    sin salir de los ticks utilizables del pool.
+    """
+    tick = int(tick)
+    if mode == "down":
+        snapped = (tick // tick_spacing) * tick_spacing
+    elif mode == "up":
+        snapped = -((-tick) // tick_spacing) * tick_spacing
+    elif mode == "nearest":
+        snapped = ((2 * tick + tick_spacing) // (2 * tick_spacing)) * tick_spacing
+    else:
+        raise ValueError(f"Modo de ajuste desconocido: {mode}")
+
+    min_usable = -(MAX_TICK // tick_spacing) * tick_spacing
+    return min(max(snapped, min_usable), -min_usable)
+
+
+# --- Precios humanos <-> sqrtPriceX96 ---
+def price_to_sqrt_price_x96(price, decimals0=0, decimals1=0):
+    """sqrtPriceX96 (redondeo hacia abajo) de un precio Token1/Token0 en unidades humanas."""
+    raw = float(price) * 10 ** (decimals1 - decimals0)
+    if not raw > 0: raise ValueError(f"Precio no válido: {price}")
+    return math.isqrt(int(raw * (1 << 192)))
+
+
+def sqrt_price_x96_to_price(sqrt_price_x96, decimals0=0, decimals1=0):
+    """Precio Token1/Token0 en unidades humanas de un sqrtPriceX96."""
+    sqrt_price_x96 = int(sqrt_price_x96)
+    return (sqrt_price_x96 * sqrt_price_x96) / (1 << 192) / 10 ** (decimals1 - decimals0)
+
+
+def price_to_tick(price, decimals0=0, decimals1=0):
+    return get_tick_at_sqrt_ratio(price_to_sqrt_price_x96(price, decimals0, decimals1))
+
+
+def tick_to_price(tick, decimals0=0, decimals1=0):
+    return sqrt_price_x96_to_price(get_sqrt_ratio_at_tick(tick), decimals0, decimals1)
+
+
+def snap_price_range(price_lower, price_upper, fee_tier, decimals0=0, decimals1=0):
+    """
+    Rango de precios ajustado a ticks reales del fee tier: el límite inferior
+    baja y el superior sube al tick utilizable más cercano. Devuelve
+    (tick_lower, tick_upper, precio_inferior, precio_superior).
+    """
+    spacing = tick_spacing_for_fee(fee_tier)
+    tick_lower = snap_tick(price_to_tick(price_lower, decimals0, decimals1), spacing, "down")
+    tick_upper = snap_tick(price_to_tick(price_upper, decimals0, decimals1), spacing, "up")
+    if tick_upper <= tick_lower:
+        tick_upper = tick_lower + spacing
+    return (tick_lower, tick_upper,
+            tick_to_price(tick_lower, decimals0, decimals1),
+            tick_to_price(tick_upper, decimals0, decimals1))
+
+
+# --- Cantidades (SqrtPriceMath / LiquidityAmounts) ---
+def _mul_div(a, b, denominator):
+    return (a * b) // denominator
+
+
+def _mul_div_rounding_up(a, b, denominator):
+    return -((-a * b) // denominator)
+
+
+def get_amount0_delta(sqrt_a_x96, sqrt_b_x96, liquidity, round_up=False):
+    """Token0 entre dos sqrtPriceX96 para una liquidez (SqrtPriceMath.getAmount0Delta)."""
+    if sqrt_a_x96 > sqrt_b_x96: sqrt_a_x96, sqrt_b_x96 = sqrt_b_x96, sqrt_a_x96
+    if sqrt_a_x96 <= 0: raise ValueError("sqrtPriceX96 debe ser positivo")
+
+    numerator1 = int(liquidity) << 96
+    numerator2 = sqrt_b_x96 - sqrt_a_x96
+    if round_up:
+        return -(-_mul_div_rounding_up(numerator1, numerator2, sqrt_b_x96) // sqrt_a_x96)
+    return _mul_div(numerator1, numerator2, sqrt_b_x96) // sqrt_a_x96
+
+
+def get_amount1_delta(sqrt_a_x96, sqrt_b_x96, liquidity, round_up=False):
+    """Token1 entre dos sqrtPriceX96 para una liquidez (SqrtPriceMath.getAmount1Delta)."""
+    if sqrt_a_x96 > sqrt_b_x96: sqrt_a_x96, sqrt_b_x96 = sqrt_b_x96, sqrt_a_x96
+    if round_up:
+        return _mul_div_rounding_up(int(liquidity), sqrt_b_x96 - sqrt_a_x96, Q96)
+    return _mul_div(int(liquidity), sqrt_b_x96 - sqrt_a_x96, Q96)
+
+
+def get_amounts_for_liquidity(sqrt_price_x96, sqrt_a_x96, sqrt_b_x96, liquidity, round_up=False):
+    """
+    (amount0, amount1) de una posición al precio actual. Con round_up=False coincide
+    con LiquidityAmounts.getAmountsForLiquidity (lo que devuelve un burn); con
+    round_up=True, con lo que pide el pool al hacer mint.
+    """
+    if sqrt_a_x96 > sqrt_b_x96: sqrt_a_x96, sqrt_b_x96 = sqrt_b_x96, sqrt_a_x96
+    if sqrt_price_x96 <= sqrt_a_x96:
+        return get_amount0_delta(sqrt_a_x96, sqrt_b_x96, liquidity, round_up), 0
+    if sqrt_price_x96 < sqrt_b_x96:
+        return (get_amount0_delta(sqrt_price_x96, sqrt_b_x96, liquidity, round_up),
+                get_amount1_delta(sqrt_a_x96, sqrt_price_x96, liquidity, round_up))
+    return 0, get_amount1_delta(sqrt_a_x96, sqrt_b_x96, liquidity, round_up)
+
+
+def get_liquidity_for_amounts(sqrt_price_x96, sqrt_a_x96, sqrt_b_x96, amount0, amount1):
+    """Máxima liquidez con esas cantidades (LiquidityAmounts.getLiquidityForAmounts)."""
+    if sqrt_a_x96 > sqrt_b_x96: sqrt_a_x96, sqrt_b_x96 = sqrt_b_x96, sqrt_a_x96
+
+    def liquidity0(a, b):
+        return _mul_div(int(amount0), _mul_div(a, b, Q96), b - a)
+
+    def liquidity1(a, b):
+        return _mul_div(int(amount1), Q96, b - a)
+
+    if sqrt_price_x96 <= sqrt_a_x96:
+        return liquidity0(sqrt_a_x96, sqrt_b_x96)
+    if sqrt_price_x96 < sqrt_b_x96:
+        return min(liquidity0(sqrt_price_x96, sqrt_b_x96), liquidity1(sqrt_a_x96, sqrt_price_x96))
+    return liquidity1(sqrt_a_x96, sqrt_b_x96)
+
+
+# --- Camino rápido float64 (vectorizado) ---
+def ticks_to_sqrt_prices(ticks):
+    """
+    sqrt(1.0001^tick) para un array de ticks. Error relativo ~1e-15 frente al
+    camino exacto; en ticks muy negativos domina la resolución entera de
+    sqrtPriceX96 (hasta ~2e-10 cerca de MIN_TICK).
+    """
+    return np.exp(np.asarray(ticks, dtype=float) * _LOG_SQRT_10001)
+
+
+def ticks_to_prices(ticks):
+    return np.exp(np.asarray(ticks, dtype=float) * (2 * _LOG_SQRT_10001))
+
+
+def prices_to_ticks(prices):
+    """
+    floor(log_1.0001(precio)) para un array de precios. En precios que caen
+    justo sobre la frontera de un tick puede diferir en 1 del camino exacto.
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.floor(np.log(np.asarray(prices, dtype=float)) / (2 * _LOG_SQRT_10001)).astype(np.int64)
+
+
+def snap_ticks(ticks, tick_spacing, mode="nearest"):
+    """snap_tick sobre un array de ticks."""
+    ticks = np.asarray(ticks, dtype=np.int64)
+    if mode == "down":
+        snapped = np.floor_divide(ticks, tick_spacing) * tick_spacing
+    elif mode == "up":
+        snapped = -np.floor_divide(-ticks, tick_spacing) * tick_spacing
+    elif mode == "nearest":
+        snapped = np.floor_divide(2 * ticks + tick_spacing, 2 * tick_spacing) * tick_spacing
+    else:
+        raise ValueError(f"Modo de ajuste desconocido: {mode}")
+
+    max_usable = (MAX_TICK // tick_spacing) * tick_spacing
+    return np.clip(snapped, -max_usable, max_usable)
+
+
+# --- Benchmark ---
+def benchmark(n_ticks=1_000_000, seed=0):
+    """Compara tick -> sqrtPrice exacto (enteros) y float64 sobre `n_ticks` ticks aleatorios."""
+    ticks = np.random.default_rng(seed).integers(MIN_TICK, MAX_TICK + 1, n_ticks)
+    tick_list = ticks.tolist()
+
+    t0 = time.perf_counter()
+    exact = [get_sqrt_ratio_at_tick(t) for t in tick_list]
+    t_exact = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    fast = ticks_to_sqrt_prices(ticks)
+    t_fast = time.perf_counter() - t0
+
+    exact_float = np.array([s / Q96 for s in exact])
+    rel_error = np.abs(fast / exact_float - 1)
+    return {
+        "n_ticks": n_ticks,
+        "exact_s": t_exact,
+        "float_s": t_fast,
+        "speedup": t_exact / t_fast if t_fast > 0 else float('inf'),
+        "max_rel_error": float(rel_error.max()),
+    }
+
+
+if __name__ == "__main__":
+    res = benchmark()
+    print(f"{res['n_ticks']:,} ticks | exacto: {res['exact_s']:.2f}s | float64: {res['float_s'] * 1000:.1f}ms "
+          f"| x{res['speedup']:.0f} | error relativo máx: {res['max_rel_error']:.2e}")
@@ -0,0 +1,122 @@
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+from .fixtures import wrap_from_env
+from .resilience import ResilientTransport
+
+# (connect, read) en segundos
+DEFAULT_TIMEOUT = (3.05, 20.0)
+
+
+class HttpTransport:
+    """
+    Capa HTTP compartida: sesión keep-alive con pool de conexiones por host,
+    compresión gzip y timeouts obligatorios. Lleva contadores de reutilización
+    de conexiones y latencia por petición.
+    """
+
+    def __init__(self, pool_connections=4, pool_maxsize=32, timeout=DEFAULT_TIMEOUT, latency_window=1000):
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update({
+            'User-Agent': 'Mozilla/5.0',
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive',
+        })
+
+        # pool_connections = nº de hosts cacheados, pool_maxsize = sockets por host
+        self.adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=latency_window)
+        self._requests = 0
+        self._errors = 0
+        self._opened_base = 0
+
+    def get(self, url, params=None, headers=None, timeout=None, stream=False):
+        """GET sobre la sesión compartida. Devuelve el objeto Response."""
+        t0 = time.perf_counter()
+        try:
+            response = self.session.get(
+                url, params=params, headers=headers,
+                timeout=timeout or self.timeout, stream=stream
+            )
+        except Exception:
+            with self._lock:
+                self._requests += 1
+                self._errors += 1
+            raise
+
+        elapsed = time.perf_counter() - t0
+        with self._lock:
+            self._requests += 1
+            self._latencies.append(elapsed)
+        return response
+
+    def get_json(self, url, params=None, headers=None, timeout=None):
+        response = self.get(url, params=params, headers=headers, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def _connections_opened(self):
+        """Suma las conexiones TCP creadas por cada pool de urllib3."""
+        pools = self.adapter.poolmanager.pools
+        total = 0
+        for key in list(pools.keys()):
+            try:
+                total += pools[key].num_connections
+            except KeyError:
+                pass
+        return total
+
+    def stats(self):
+        """Contadores de reutilización de conexiones y latencia (ms)."""
+        with self._lock:
+            n_requests = self._requests
+            n_errors = self._errors
+            lat = np.array(self._latencies, dtype=float) * 1000.0
+
+        opened = self._connections_opened() - self._opened_base
+        return {
+            "requests": n_requests,
+            "errors": n_errors,
+            "connections_opened": opened,
+            "connections_reused": max(n_requests - n_errors - opened, 0),
+            "latency_avg_ms": float(lat.mean()) if lat.size else 0.0,
+            "latency_p50_ms": float(np.percentile(lat, 50)) if lat.size else 0.0,
+            "latency_p95_ms": float(np.percentile(lat, 95)) if lat.size else 0.0,
+        }
+
+    def reset_stats(self):
+        with self._lock:
+            self._latencies.clear()
+            self._requests = 0
+            self._errors = 0
+        self._opened_base = self._connections_opened()
+
+    def close(self):
+        self.session.close()
+
+
+_shared_transport = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_transport():
+    """
+    Transporte único por proceso (todas las sesiones de Streamlit lo comparten).
+    Con UNI_V3_FIXTURE_MODE se envuelve en el modo grabación/reproducción.
+    Por encima van los presupuestos de latencia, hedging y circuit breaker.
+    """
+    global _shared_transport
+    with _shared_lock:
+        if _shared_transport is None:
+            _shared_transport = ResilientTransport(wrap_from_env(HttpTransport()))
+        return _shared_transport
@@ -0,0 +1,139 @@
+import itertools
+import math
+
+import numpy as np
+import pandas as pd
+
+from .backtester import Backtester
+from .grid_search import COLUMNS, PARAMS, run_tasks
+from .pool_history import PoolHistory, dates_to_datetime64
+
+SAMPLES_PER_DAY = 3  # Un snapshot cada 8h
+SWITCH_COST = 0.997  # Coste swap al reabrir la posición (igual que en un rebalanceo)
+
+
+def make_folds(n_samples, train_days, test_days, max_vol_days, n_folds=None):
+    """
+    Folds (train_offset, test_offset) en snapshots desde el más reciente, del más
+    antiguo al más reciente. Los tramos de test son consecutivos y no se solapan;
+    cada entrenamiento usa los `train_days` inmediatamente anteriores a su test
+    (más el calentamiento de volatilidad, que cae antes del entrenamiento).
+    """
+    if test_days < 1:
+        raise ValueError(f"test_days debe ser >= 1 (recibido {test_days})")
+    if train_days < 0:
+        raise ValueError(f"train_days no puede ser negativo (recibido {train_days})")
+    test_len = test_days * SAMPLES_PER_DAY
+    needed = (train_days + max_vol_days) * SAMPLES_PER_DAY + 1
+    folds = []
+    offset = 0
+    while offset + test_len + needed <= n_samples:
+        folds.append((offset + test_len, offset))
+        offset += test_len
+    if n_folds is not None:
+        folds = folds[:n_folds]
+    return folds[::-1]
+
+
+def walk_forward(history, investment_usd=10000.0, train_days=30, test_days=7, sd_multipliers=(0.5, 1.0, 1.5, 2.0),
+                 vol_days=(3, 7, 14), auto_rebalance=(False, True), fee_tier=0.003, n_folds=None, max_workers=None,
+                 rank_by="Valor Final"):
+    """
+    Optimización walk-forward de la estrategia de rango de un pool.
+
+    Para cada fold se busca en la rejilla de parámetros la mejor combinación sobre
+    los `train_days` de entrenamiento y se aplica a los `test_days` siguientes, que
+    el optimizador no ha visto. Todas las simulaciones de entrenamiento (folds x
+    combinaciones) van en un único pool de procesos con capital unitario (el
+    ranking no depende del capital). Los tramos de test se encadenan: cada uno
+    reabre la posición con el valor final del anterior (menos el coste swap) y se
+    obtiene escalando el resultado unitario del Backtester. HODL Value es un solo
+    buy-and-hold: los tokens del reparto inicial del primer tramo invertido, con todo el
+    capital, valorados durante todo el periodo fuera de muestra.
+
+    Devuelve (equity, folds):
+    - equity: curva fuera de muestra (Date, Price, Fold, Range Min, Range Max,
+      In Range, Fees Acum, Valor Total, HODL Value)
+    - folds: una fila por fold con fechas, parámetros elegidos y resultado
+    """
+    history = PoolHistory.coerce(history)
+    combos = list(itertools.product(sd_multipliers, vol_days, (train_days,), auto_rebalance))
+    if not combos: return None
+    folds = make_folds(len(history), train_days, test_days, max(vol_days), n_folds)
+    if not folds: return None
+
+    # --- 1. Entrenamiento: toda la rejilla de todos los folds a la vez ---
+    tasks = [(train_offset, c) for train_offset, _ in folds for c in combos]
+    rows = run_tasks(history, tasks, 1.0, fee_tier, max_workers)
+    train = pd.DataFrame(rows, columns=COLUMNS)
+    train["Fold"] = np.repeat(np.arange(len(folds)), len(combos))
+
+    # --- 2. Test: mejores parámetros de cada fold, encadenando el capital ---
+    tester = Backtester(cache=False)
+    dates = dates_to_datetime64(history.date)
+    capital = float(investment_usd)
+    hodl_x = hodl_y = None
+    fees_offset = 0.0
+    segments, summary = [], []
+
+    for k, (train_offset, test_offset) in enumerate(folds):
+        fold_rows = train[train["Fold"] == k]
+        ranked = fold_rows.sort_values(rank_by, ascending=False, na_position='last', kind='stable')
+        best = ranked.iloc[0] if len(ranked) else None
+        train_start = train_offset + train_days * SAMPLES_PER_DAY - 1
+        info = {
+            "Fold": k,
+            "Train Inicio": dates[train_start],
+            "Train Fin": dates[train_offset],
+            "Test Inicio": dates[train_offset - 1],
+            "Test Fin": dates[test_offset],
+        }
+
+        unit = None
+        if best is not None and not math.isnan(best[rank_by]):
+            params = {name: best[name] for name in PARAMS if name != "sim_days"}
+            info.update(params)
+            info["Train ROI %"] = best["ROI %"]
+            unit = tester.run_simulation(
+                history[test_offset:], 1.0, float(params["sd_multiplier"]), sim_days=test_days,
+                vol_days=int(params["vol_days"]), fee_tier=fee_tier, auto_rebalance=bool(params["auto_rebalance"])
+            )
+
+        if unit is None or unit[0].empty:
+            # Sin parámetros válidos o sin datos: el capital se queda sin invertir en este tramo
+            info.update({"Capital Inicial": capital, "Valor Final": capital, "ROI Test %": 0.0,
+                         "Rebalanceos": 0, "Estado": "Sin datos"})
+            summary.append(info)
+            continue
+
+        # Precios de las filas simuladas (mismo recorte que Backtester._simulate)
+        vd = int(params["vol_days"])
+        chrono = history[test_offset:][:(test_days + vd) * SAMPLES_PER_DAY][::-1]
+        p_native, p_base_usd, _, _, _ = tester._valid_rows(chrono, vd * SAMPLES_PER_DAY)
+        if hodl_x is None:
+            # Reparto de tokens de la entrada inicial, que se mantiene hasta el final
+            _, hodl_x, hodl_y = tester._calculate_liquidity_and_amounts(
+                capital, float(p_native[0]), float(p_base_usd[0]), unit[1], unit[2]
+            )
+
+        if segments:
+            capital *= SWITCH_COST
+        df, _, _, meta = Backtester.scale_result(unit, capital)
+        df["HODL Value"] = (hodl_x * p_base_usd) + (hodl_y * (p_base_usd / p_native))
+        df["Fees Acum"] += fees_offset
+        df["Fold"] = k
+        segments.append(df)
+
+        final = float(df["Valor Total"].iat[-1])
+        info.update({"Capital Inicial": capital, "Valor Final": final, "ROI Test %": (final - capital) / capital * 100,
+                     "Rebalanceos": meta["rebalances"], "Estado": "OK"})
+        summary.append(info)
+        capital = final
+        fees_offset = float(df["Fees Acum"].iat[-1])
+
+    folds_table = pd.DataFrame(summary)
+    if not segments: return pd.DataFrame([]), folds_table
+    equity = pd.concat(segments, ignore_index=True)[
+        ["Date", "Price", "Fold", "Range Min", "Range Max", "In Range", "Fees Acum", "Valor Total", "HODL Value"]
+    ]
+    return equity, folds_table
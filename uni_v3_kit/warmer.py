@@ -0,0 +1,139 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .catalogue import pool_id
+from .data_provider import DataProvider
+
+
+class CacheWarmer(threading.Thread):
+    """
+    Hilo en segundo plano que mantiene caliente la caché del DataProvider:
+    refresca el listado y los historiales de los top-N pools por volumen de
+    cada red, con jitter y un límite de descargas simultáneas. Los historiales
+    solo se refrescan si el DataProvider tiene caché (store).
+    """
+
+    def __init__(self, provider=None, interval=1800, top_n=30, max_workers=4, jitter=0.2):
+        super().__init__(name="uni-v3-cache-warmer", daemon=True)
+        self.provider = provider or DataProvider()
+        self.interval = interval
+        self.top_n = top_n
+        self.max_workers = max_workers
+        self.jitter = jitter
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._status = {
+            "runs": 0,
+            "last_run_at": None,
+            "last_duration_s": 0.0,
+            "total_duration_s": 0.0,
+            "pools_warmed": 0,
+            "histories_fetched": 0,
+            "errors": 0,
+        }
+
+    def _jittered(self, seconds):
+        return seconds * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def select_pools(self, pools):
+        """Top-N direcciones por Volume dentro de cada ChainId."""
+        by_chain = {}
+        for p in pools:
+            by_chain.setdefault(p.get('ChainId'), []).append(p)
+
+        addresses = []
+        for chain_pools in by_chain.values():
+            def volume(p):
+                try: return float(p.get('Volume', 0) or 0)
+                except (TypeError, ValueError): return 0.0
+            top = sorted(chain_pools, key=volume, reverse=True)[:self.top_n]
+            addresses.extend(pool_id(p) for p in top if pool_id(p))
+        return addresses
+
+    def _warm_one(self, address):
+        # Reparte las peticiones en el tiempo para no golpear la API en ráfaga
+        time.sleep(random.uniform(0, self.jitter))
+        return self.provider.refresh_pool_history(address)
+
+    def run_once(self):
+        t0 = time.time()
+        self.provider.refresh_pools(force=True)
+        # Sin caché de historiales no queda nada guardado: solo se calienta el listado
+        addresses = self.select_pools(self.provider.catalogue.pools) if self.provider.store is not None else []
+
+        fetched = errors = 0
+        if addresses:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                for ok in pool.map(self._warm_one, addresses):
+                    if ok: fetched += 1
+                    else: errors += 1
+
+        duration = time.time() - t0
+        with self._lock:
+            self._status["runs"] += 1
+            self._status["last_run_at"] = time.time()
+            self._status["last_duration_s"] = duration
+            self._status["total_duration_s"] += duration
+            self._status["pools_warmed"] = len(addresses)
+            self._status["histories_fetched"] += fetched
+            self._status["errors"] += errors
+
+    def run(self):
+        # Arranque escalonado si hay varios procesos desplegados a la vez
+        if self._stop_event.wait(random.uniform(0, self.jitter * 10)): return
+        while not self._stop_event.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Error en el warmer de caché: {e}")
+                with self._lock:
+                    self._status["errors"] += 1
+            self._stop_event.wait(self._jittered(self.interval))
+
+    def stop(self):
+        self._stop_event.set()
+
+    def status(self):
+        """Frescura de los datos calentados y coste acumulado del propio warmer."""
+        with self._lock:
+            status = dict(self._status)
+        last = status["last_run_at"]
+        status["running"] = self.is_alive()
+        status["age_s"] = (time.time() - last) if last else None
+        status["catalogue_version"] = self.provider.catalogue.version
+        status["has_store"] = self.provider.store is not None
+        return status
+
+
+_warmer = None
+_warmer_lock = threading.Lock()
+
+
+def start_cache_warmer(**kwargs):
+    """Arranca el warmer una sola vez por proceso y lo devuelve."""
+    global _warmer
+    with _warmer_lock:
+        if _warmer is None or not _warmer.is_alive():
+            _warmer = CacheWarmer(**kwargs)
+            _warmer.start()
+        return _warmer
+
+
+def get_cache_warmer():
+    return _warmer
+
+
+def start_from_env():
+    """
+    Arranca el warmer si UNI_V3_WARMER=1. Ajustes opcionales:
+    UNI_V3_WARMER_INTERVAL (s), UNI_V3_WARMER_TOP_N, UNI_V3_WARMER_WORKERS.
+    """
+    if os.environ.get("UNI_V3_WARMER", "0") != "1": return None
+    return start_cache_warmer(
+        interval=float(os.environ.get("UNI_V3_WARMER_INTERVAL", 1800)),
+        top_n=int(os.environ.get("UNI_V3_WARMER_TOP_N", 30)),
+        max_workers=int(os.environ.get("UNI_V3_WARMER_WORKERS", 4)),
+    )
@@ -1,5 +1,9 @@
 import streamlit as st
 from auth_module import show_auth_interface
+from uni_v3_kit.warmer import start_from_env as start_cache_warmer
+
+# Warmer de caché de pools (solo si UNI_V3_WARMER=1; una vez por proceso)
+start_cache_warmer()
 
 # Configuración de la página
 st.set_page_config(